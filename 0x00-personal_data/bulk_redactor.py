@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+""" Bulk redaction module for CSV exports and SQL dumps """
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from filtered_logger import PII_FIELDS, RedactingFormatter
+from typing import BinaryIO, Dict, List, Sequence
+import csv
+import io
+import os
+import re
+import sys
+
+
+CHUNK_SIZE = 16 * 1024 * 1024
+SCAN_SIZE = 1024 * 1024
+SQL_INSERT_START = re.compile(r"^\s*(?:INSERT|REPLACE)\b", re.IGNORECASE)
+SQL_INSERT = re.compile(r"^\s*(?:INSERT|REPLACE)(?:\s+IGNORE)?\s+INTO\s+"
+                        r"([`\w.]+)\s*(?:\(([^)]*)\))?\s*VALUES",
+                        re.IGNORECASE)
+SQL_CREATE_TABLE = re.compile(r"^\s*CREATE\s+(?:TEMPORARY\s+)?TABLE\s+"
+                              r"(?:IF\s+NOT\s+EXISTS\s+)?([`\w.]+)\s*\(",
+                              re.IGNORECASE)
+SQL_CONSTRAINTS = ("PRIMARY", "KEY", "UNIQUE", "CONSTRAINT", "INDEX",
+                   "FULLTEXT", "SPATIAL", "CHECK", "FOREIGN")
+SQL_TOKEN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\""
+                       r"|[(),]|[^\s(),'\"]+")
+
+
+def redact_csv(data: str, positions: Sequence[int], redaction: str) -> str:
+    """ Obfuscates the columns at the given positions of CSV rows
+        Args:
+            - data: CSV rows, without header
+            - positions: indexes of the columns to obfuscate
+            - redaction: string replacing obfuscated values
+        Return: obfuscated CSV rows, every value quoted
+    """
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    for row in csv.reader(io.StringIO(data, newline="")):
+        for position in positions:
+            if position < len(row):
+                row[position] = redaction
+        writer.writerow(row)
+    return output.getvalue()
+
+
+def redact_sql(data: str, fields: Sequence[str], redaction: str,
+               tables: Dict[str, Sequence[str]] = None) -> str:
+    """ Obfuscates the values of the given columns in INSERT statements
+        Statements must hold on one line. The columns of an INSERT
+        without a column list are those of its table in tables.
+        A value is replaced as a whole, function calls included.
+        Args:
+            - data: lines of a SQL dump
+            - fields: names of the columns to obfuscate
+            - redaction: string replacing obfuscated values
+            - tables: column names of each table, in order
+        Return: obfuscated SQL lines
+        Raise: ValueError on an INSERT whose columns are unknown or
+               which does not hold on one line, rather than leaving
+               its values in clear
+    """
+    tables = tables or {}
+    lines = []
+    for line in io.StringIO(data, newline="\n"):
+        if SQL_INSERT_START.match(line) is None:
+            lines.append(line)
+            continue
+        match = SQL_INSERT.match(line)
+        if match is None:
+            raise ValueError("Cannot parse INSERT: {}".format(line[:80]))
+        if match.group(2) is not None:
+            columns = [_sql_name(column)
+                       for column in match.group(2).split(",")]
+        else:
+            columns = tables.get(_sql_name(match.group(1)))
+            if columns is None:
+                raise ValueError("Unknown columns of table {}".format(
+                    _sql_name(match.group(1))))
+        positions = {i for i, column in enumerate(columns)
+                     if column in fields}
+        if not positions:
+            lines.append(line)
+            continue
+        parts = [line[:match.end()]]
+        end = match.end()
+        depth = 0
+        index = 0
+        redacted = False
+        for token in SQL_TOKEN.finditer(line, match.end()):
+            value = token.group()
+            if value == "(":
+                depth += 1
+                if depth == 1:
+                    index = 0
+                    redacted = False
+            elif value == ")":
+                depth -= 1
+            elif value == "," and depth == 1:
+                index += 1
+                redacted = False
+            elif depth == 0 and value not in (",", ";"):
+                raise ValueError("Cannot redact after VALUES: {}".format(
+                    line[:80]))
+            in_value = depth > 1 or (depth == 1 and value not in "(,")
+            if in_value and index in positions:
+                if redacted:
+                    end = token.end()
+                    continue
+                quote = value[0] if value[0] in "'\"" else "'"
+                value = "{}{}{}".format(quote, redaction, quote)
+                redacted = True
+            parts.append(line[end:token.start()])
+            parts.append(value)
+            end = token.end()
+        if depth != 0:
+            raise ValueError("INSERT not on one line: {}".format(line[:80]))
+        parts.append(line[end:])
+        lines.append("".join(parts))
+    return "".join(lines)
+
+
+def sql_tables(f: BinaryIO) -> Dict[str, List[str]]:
+    """ Reads the column names of each CREATE TABLE of a SQL dump
+        Return: dictionary of table name to its columns, in order
+    """
+    tables = {}
+    statement = None
+    for line in f:
+        line = line.decode("utf-8")
+        if statement is None:
+            match = SQL_CREATE_TABLE.match(line)
+            if match is None:
+                continue
+            name = _sql_name(match.group(1))
+            statement = line[match.end():]
+        else:
+            statement += line
+        if ";" not in statement:
+            continue
+        columns = []
+        for definition in _sql_split(statement):
+            words = definition.split()
+            if words and words[0].upper() not in SQL_CONSTRAINTS:
+                columns.append(_sql_name(words[0]))
+        tables[name] = columns
+        statement = None
+    return tables
+
+
+def _sql_split(statement: str) -> List[str]:
+    """ Column definitions of the body of a CREATE TABLE, which starts
+        after its opening parenthesis
+    """
+    definitions = [""]
+    depth = 1
+    for token in SQL_TOKEN.finditer(statement):
+        value = token.group()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+            if depth == 0:
+                break
+        elif value == "," and depth == 1:
+            definitions.append("")
+            continue
+        definitions[-1] += " " + value
+    return definitions
+
+
+def _sql_name(name: str) -> str:
+    """ Unquoted name of a column or table, without database prefix """
+    return name.strip(" `\"\t\r\n").split(".")[-1].strip("`\"")
+
+
+def _record_ends(f: BinaryIO, start: int, size: int,
+                 chunk_size: int) -> List[int]:
+    """ Offsets where CSV chunks of about chunk_size bytes end
+        A chunk ends after the first newline past chunk_size bytes
+        that is outside quotes: quotes inside a quoted field being
+        doubled, that is a newline after an even number of quotes.
+        Return: end offset of every chunk but the last one
+    """
+    ends = []
+    target = start + chunk_size
+    position = start
+    quoted = 0
+    f.seek(start)
+    while target < size:
+        block = f.read(SCAN_SIZE)
+        if not block:
+            break
+        i = 0
+        while i < len(block):
+            skip = min(max(target - position, i), len(block))
+            quoted ^= block.count(b'"', i, skip) & 1
+            i = skip
+            j = block.find(b"\n", i)
+            if j < 0:
+                quoted ^= block.count(b'"', i) & 1
+                break
+            quoted ^= block.count(b'"', i, j) & 1
+            i = j + 1
+            if not quoted:
+                ends.append(position + i)
+                target = position + i + chunk_size
+        position += len(block)
+    return [end for end in ends if end < size]
+
+
+def _read_chunk(f: BinaryIO, start: int, end: int) -> bytes:
+    """ Reads the lines starting in the [start, end) byte range """
+    if start > 0:
+        f.seek(start - 1)
+        f.readline()
+    position = f.tell()
+    if position >= end:
+        return b""
+    data = f.read(end - position)
+    if not data.endswith(b"\n"):
+        data += f.readline()
+    return data
+
+
+def _redact_chunk(file_path: str, start: int, end: int, is_sql: bool,
+                  fields: Sequence[str], positions: Sequence[int],
+                  redaction: str, tables: Dict[str, List[str]]) -> bytes:
+    """ Obfuscates one byte range of a file, run in a worker process
+        SQL ranges are extended to whole lines, CSV ranges already end
+        on record boundaries
+    """
+    with open(file_path, "rb") as f:
+        if is_sql:
+            data = _read_chunk(f, start, end).decode("utf-8")
+            return redact_sql(data, fields, redaction,
+                              tables).encode("utf-8")
+        f.seek(start)
+        data = f.read(end - start).decode("utf-8")
+    return redact_csv(data, positions, redaction).encode("utf-8")
+
+
+def redact_file(source: str, destination: str,
+                fields: Sequence[str] = PII_FIELDS,
+                redaction: str = RedactingFormatter.REDACTION,
+                workers: int = None, chunk_size: int = CHUNK_SIZE,
+                tables: Dict[str, Sequence[str]] = None) -> None:
+    """ Obfuscates a CSV export or a SQL dump (.sql) in parallel
+        The file is split into byte ranges processed by a pool of
+        processes; results are written back in the original order,
+        so the output is the same for any number of workers.
+        CSV ranges are cut between records, never inside a quoted
+        field. The columns of SQL INSERTs without a column list are
+        read from the CREATE TABLE statements of the dump.
+        Args:
+            - source: path of the file to obfuscate
+            - destination: path of the obfuscated file
+            - fields: names of the columns to obfuscate
+            - redaction: string replacing obfuscated values
+            - workers: number of processes, all the CPUs if None
+            - chunk_size: size in bytes of the ranges given to workers
+            - tables: column names of each table of a SQL dump,
+                      overriding those of its CREATE TABLE statements
+        Raise: ValueError on a SQL INSERT that cannot be mapped to
+               its columns
+    """
+    is_sql = source.endswith(".sql")
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(source)
+    header = b""
+    positions: List[int] = []
+    with open(source, "rb") as f:
+        if is_sql:
+            tables = dict(sql_tables(f), **(tables or {}))
+            starts = list(range(0, size, chunk_size))
+            ends = starts[1:] + [size]
+        else:
+            header_end = (_record_ends(f, 0, size, 1) or [size])[0]
+            f.seek(0)
+            header = f.read(header_end)
+            starts = [header_end] + _record_ends(f, header_end, size,
+                                                 chunk_size)
+            ends = starts[1:] + [size]
+    if not is_sql:
+        columns = next(csv.reader(io.StringIO(header.decode("utf-8"),
+                                              newline="")), [])
+        positions = [i for i, column in enumerate(columns)
+                     if column in fields]
+    with ProcessPoolExecutor(workers) as executor, \
+            open(destination, "wb") as output:
+        output.write(header)
+        pending = deque()
+        for start, end in zip(starts, ends):
+            if start >= end:
+                continue
+            pending.append(executor.submit(_redact_chunk, source, start,
+                                           end, is_sql, tuple(fields),
+                                           positions, redaction, tables))
+            if len(pending) >= 2 * workers:
+                output.write(pending.popleft().result())
+        while pending:
+            output.write(pending.popleft().result())
+
+
+def main() -> None:
+    """ Obfuscates the file given as first argument into the second """
+    if len(sys.argv) != 3:
+        print("Usage: {} <source> <destination>".format(sys.argv[0]))
+        sys.exit(1)
+    redact_file(sys.argv[1], sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
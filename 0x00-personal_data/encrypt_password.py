@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 """ Password encryption module """
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import List, Sequence
 import bcrypt
+import math
+import os
+import time
 
 
-def hash_password(password: str) -> bytes:
+ROUNDS = 12
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
+
+def hash_password(password: str, rounds: int = ROUNDS) -> bytes:
     """ Creates hashed password """
     pwd = password.encode()
-    hashed_pwd = bcrypt.hashpw(pwd, bcrypt.gensalt())
+    hashed_pwd = bcrypt.hashpw(pwd, bcrypt.gensalt(rounds))
     return hashed_pwd
 
 
@@ -17,3 +28,88 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     if bcrypt.checkpw(password.encode(), hashed_password):
         return True
     return False
+
+
+def get_rounds(hashed_password: bytes) -> int:
+    """ Gets the cost factor a hashed password was created with """
+    return int(hashed_password.split(b"$")[2])
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = ROUNDS) -> bool:
+    """ Check if a hashed password uses a lower cost factor
+        than rounds and should be hashed again
+    """
+    return get_rounds(hashed_password) < rounds
+
+
+def calibrate_rounds(budget_ms: float = 250) -> int:
+    """ Picks the highest cost factor hashing within budget on this host
+        Each extra round doubles the hashing time, so the cost is
+        extrapolated from a cheap measurement then checked
+        Args:
+            - budget_ms: maximum time in milliseconds a hash may take
+        Return: cost factor, at least MIN_ROUNDS
+    """
+    def measure(rounds: int, repeat: int = 1) -> float:
+        """ Measures the best hashing time of a cost factor, in ms """
+        salt = bcrypt.gensalt(rounds)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    elapsed = measure(MIN_ROUNDS, repeat=5)
+    if elapsed >= budget_ms:
+        return MIN_ROUNDS
+    rounds = MIN_ROUNDS + int(math.log2(budget_ms / elapsed))
+    rounds = min(rounds, MAX_ROUNDS)
+    while rounds > MIN_ROUNDS and measure(rounds) > budget_ms:
+        rounds -= 1
+    return rounds
+
+
+def _executor(workers: int = None, processes: bool = False):
+    """ Creates the pool running bcrypt calls in parallel
+        bcrypt releases the GIL, so threads already use every core
+    """
+    workers = workers or os.cpu_count() or 1
+    if processes:
+        return ProcessPoolExecutor(workers)
+    return ThreadPoolExecutor(workers)
+
+
+def hash_passwords(passwords: Sequence[str], rounds: int = ROUNDS,
+                   workers: int = None,
+                   processes: bool = False) -> List[bytes]:
+    """ Creates hashed passwords in parallel
+        Args:
+            - passwords: unhashed passwords
+            - rounds: bcrypt cost factor
+            - workers: pool size, one per CPU by default
+            - processes: use a process pool instead of threads
+        Return: hashed passwords, in the order of passwords
+    """
+    with _executor(workers, processes) as executor:
+        return list(executor.map(partial(hash_password, rounds=rounds),
+                                 passwords))
+
+
+def verify_many(hashed_passwords: Sequence[bytes], passwords: Sequence[str],
+                workers: int = None, processes: bool = False) -> List[bool]:
+    """ Checks in parallel if hashed passwords match unhashed passwords
+        Args:
+            - hashed_passwords: hashed passwords
+            - passwords: unhashed passwords, paired by position
+            - workers: pool size, one per CPU by default
+            - processes: use a process pool instead of threads
+        Return: result of each check, in the order of passwords
+        Raise: ValueError if there are not as many hashed passwords
+               as passwords
+    """
+    if len(hashed_passwords) != len(passwords):
+        raise ValueError("{} hashed passwords for {} passwords".format(
+            len(hashed_passwords), len(passwords)))
+    with _executor(workers, processes) as executor:
+        return list(executor.map(is_valid, hashed_passwords, passwords))
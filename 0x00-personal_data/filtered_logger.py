@@ -1,13 +1,24 @@
 #!/usr/bin/env python3
 """ Logs obfuscation module """
-from typing import List
+from functools import lru_cache, partial
+from typing import Callable, Iterator, List, Sequence, Tuple
 import re
 import logging
+import queue
+import threading
 import mysql.connector as connector
 import os
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+EXPORT_KEY = ()
+EXPORT_PAGE_SIZE = 10000
+EXPORT_BATCH_SIZE = 1000
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 500
+LOG_OVERFLOW = "block"
+_LOGGER_HANDLER = None
+_LOGGER_LOCK = threading.Lock()
 
 
 def filter_datum(fields: List[str], redaction: str,
@@ -23,10 +34,28 @@ def filter_datum(fields: List[str], redaction: str,
                        character is separating all fields
                        in the log line (message)
     """
-    for field in fields:
-        message = re.sub(r"{}=.*?{}".format(field, separator),
-                         f"{field}={redaction}{separator}", message)
-    return message
+    redact = _redaction_engine(tuple(fields), redaction, separator)
+    return redact(message)
+
+
+@lru_cache(maxsize=None)
+def _redaction_engine(fields: Tuple[str, ...], redaction: str,
+                      separator: str) -> Callable[[str], str]:
+    """ Compiles all fields into a single alternation pattern so
+        a log line is obfuscated in one pass instead of one pass
+        per field
+        Fields and separator are matched literally, so a separator
+        such as "|" or "." is not read as a regular expression
+        Return:
+            - a callable taking a message and returning it obfuscated
+    """
+    if not fields:
+        return lambda message: message
+    pattern = re.compile(r"({})=.*?{}".format(
+        "|".join(re.escape(field) for field in fields),
+        re.escape(separator)))
+    suffix = "={}{}".format(redaction, separator)
+    return partial(pattern.sub, lambda match: match.group(1) + suffix)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -37,31 +66,188 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], redaction: str = REDACTION,
+                 separator: str = SEPARATOR):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self._redact = _redaction_engine(tuple(fields), redaction, separator)
 
     def format(self, record: logging.LogRecord) -> str:
         """ Custom formatting of log messages """
-        return filter_datum(fields=self.fields,
-                            redaction=RedactingFormatter.REDACTION,
-                            message=super().format(record),
-                            separator=RedactingFormatter.SEPARATOR)
+        return self._redact(super().format(record))
+
 
+class BatchingHandler(logging.StreamHandler):
+    """ Stream handler formatting and writing records on a background
+        worker, so the logging thread only pays for a queue insertion
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+    def __init__(self, stream=None, capacity: int = LOG_QUEUE_SIZE,
+                 batch_size: int = LOG_BATCH_SIZE,
+                 overflow: str = LOG_OVERFLOW):
+        """ Initialize a BatchingHandler instance
+            Args:
+                - stream: stream records are written to, stderr if None
+                - capacity: maximum number of records waiting in queue
+                - batch_size: maximum number of records per write
+                - overflow: what to do with a record when the queue is
+                            full: block the caller, drop the oldest
+                            queued record or drop the new one
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        super(BatchingHandler, self).__init__(stream)
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.dropped = 0
+        self.queue = queue.Queue(capacity)
+        self._closing = threading.Event()
+        self._worker = threading.Thread(target=self._drain, daemon=True)
+        self._worker.start()
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """ Filters and queues a record without taking the handler
+            lock, the queue being thread safe already
+        """
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """ Queues a record, formatting is left to the worker
+            Once the handler is closing, records are written directly
+        """
+        if self._closing.is_set() or not self._worker.is_alive():
+            super(BatchingHandler, self).emit(record)
+            return
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                if self.overflow == "drop-newest":
+                    self.dropped += 1
+                    return
+            try:
+                oldest = self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            self.queue.task_done()
+            if oldest is None:
+                self.queue.put(None)
+                super(BatchingHandler, self).emit(record)
+                return
+            self.dropped += 1
+
+    def flush(self) -> None:
+        """ Waits for every queued record to be written """
+        if self._worker.is_alive():
+            self.queue.join()
+        super(BatchingHandler, self).flush()
+
+    def close(self) -> None:
+        """ Writes pending records then stops the worker
+            The worker stops at a None record, which is never dropped;
+            records queued behind it are written here
+        """
+        self._closing.set()
+        if self._worker.is_alive():
+            self.queue.put(None)
+            self._worker.join()
+        records = []
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            if record is not None:
+                records.append(record)
+        self._write(records)
+        super(BatchingHandler, self).close()
 
-def get_logger() -> logging.Logger:
+    def _drain(self) -> None:
+        """ Worker loop writing queued records in batches """
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not None]
+            try:
+                self._write(records)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if len(records) < len(batch):
+                return
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        """ Formats records and writes them with a single flush
+            Only the worker writes to the stream, so the handler lock
+            is left to logging.shutdown which holds it while flushing
+        """
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+
+
+def get_logger(fields: Sequence[str] = PII_FIELDS,
+               redaction: str = RedactingFormatter.REDACTION,
+               separator: str = RedactingFormatter.SEPARATOR,
+               stream=None, asynchronous: bool = False) -> logging.Logger:
     """ Creates and returns a logger object with:
-        1. A stream handler
+        1. A stream handler, formatting and writing records on a
+           background worker when asynchronous is True
         2. Logging level set to INFO
         3. Redacting formatter
+        The handler of the last configuration is kept: calling it again
+        with the same arguments leaves the logger untouched, and a new
+        configuration closes and replaces the handler instead of adding
+        one.
+        Pending records are written when logging shuts down at exit.
     """
-    formatter = RedactingFormatter(list(PII_FIELDS))
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(formatter)
+    global _LOGGER_HANDLER
+    config = (tuple(fields), redaction, separator, stream, asynchronous)
     logger = logging.getLogger("user_data")
-    logger.propagate = False
-    logger.setLevel(logging.INFO)
-    logger.addHandler(stream_handler)
+    with _LOGGER_LOCK:
+        if _LOGGER_HANDLER is not None and _LOGGER_HANDLER[0] == config:
+            handler = _LOGGER_HANDLER[1]
+        else:
+            formatter = RedactingFormatter(list(fields), redaction,
+                                           separator)
+            if asynchronous:
+                handler = BatchingHandler(stream)
+            else:
+                handler = logging.StreamHandler(stream)
+            handler.setFormatter(formatter)
+            if _LOGGER_HANDLER is not None:
+                logger.removeHandler(_LOGGER_HANDLER[1])
+                _LOGGER_HANDLER[1].close()
+            _LOGGER_HANDLER = (config, handler)
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
     return logger
 
 
@@ -76,11 +262,132 @@ def get_db() -> connector.connection.MySQLConnection:
     return connection
 
 
+def stream_rows(db_connection: connector.connection.MySQLConnection,
+                table: str = "users", key: Sequence[str] = EXPORT_KEY,
+                page_size: int = EXPORT_PAGE_SIZE,
+                batch_size: int = EXPORT_BATCH_SIZE
+                ) -> Iterator[Tuple[Tuple[str, ...], tuple]]:
+    """ Streams every row of a table with bounded memory
+        Without key, the table is read by one query through an
+        unbuffered cursor, batch_size rows at a time.
+        With key, rows are read by keyset pagination over the key
+        columns, which must be sortable, non null and unique together,
+        each page through an unbuffered cursor.
+        Rows left unread when the stream stops early or fails are
+        consumed before the cursor is closed.
+        Args:
+            - db_connection: open database connection
+            - table: name of the table to export
+            - key: columns the pages are ordered and resumed on
+            - page_size: maximum number of rows per query
+            - batch_size: number of rows fetched from the server at once
+        Return: iterator of (column names, row values)
+        Raise: ValueError on a null or repeated key, which pagination
+               would skip rows after
+    """
+    for name in (table,) + tuple(key):
+        if not re.fullmatch(r"\w+", name):
+            raise ValueError("Invalid identifier: {}".format(name))
+    if not key:
+        cursor = db_connection.cursor(buffered=False)
+        try:
+            cursor.execute("SELECT * FROM {};".format(table))
+            columns = tuple(column[0] for column in cursor.description)
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    yield columns, row
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            _close_cursor(db_connection, cursor)
+        return
+    order = ", ".join(key)
+    values = ", ".join(["%s"] * len(key))
+    after = "({}) > ({})".format(order, values)
+    same = "SELECT COUNT(*) FROM {} WHERE ({}) = ({});".format(
+        table, order, values)
+    last_key = None
+    while True:
+        query = "SELECT * FROM {}".format(table)
+        if last_key is not None:
+            query += " WHERE {}".format(after)
+        query += " ORDER BY {} LIMIT {};".format(order, int(page_size))
+        cursor = db_connection.cursor(buffered=False)
+        try:
+            cursor.execute(query, last_key)
+            columns = tuple(column[0] for column in cursor.description)
+            positions = [columns.index(column) for column in key]
+            count = 0
+            rows = cursor.fetchmany(batch_size)
+            while rows:
+                for row in rows:
+                    row_key = tuple(row[i] for i in positions)
+                    if None in row_key or row_key == last_key:
+                        raise ValueError("Export key {} is null or not "
+                                         "unique: {}".format(key, row_key))
+                    last_key = row_key
+                    yield columns, row
+                count += len(rows)
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            _close_cursor(db_connection, cursor)
+        if count < page_size:
+            return
+        cursor = db_connection.cursor(buffered=True)
+        try:
+            cursor.execute(same, last_key)
+            if cursor.fetchone()[0] > 1:
+                raise ValueError("Export key {} is not unique: {}".format(
+                    key, last_key))
+        finally:
+            cursor.close()
+
+
+def _close_cursor(db_connection: connector.connection.MySQLConnection,
+                  cursor) -> None:
+    """ Closes a cursor, first reading what is left of its result, so
+        an export stopped early or failing leaves the connection usable
+        and its error is not replaced by "Unread result found"
+    """
+    if db_connection.unread_result:
+        db_connection.consume_results()
+    cursor.close()
+
+
+def export_users(db_connection: connector.connection.MySQLConnection,
+                 logger: logging.Logger) -> None:
+    """ Logs every user with bounded memory, whatever the table size
+        Pagination is configured by the environment variables
+        PERSONAL_DATA_EXPORT_KEY (comma separated columns, unique and
+        non null, one query when unset),
+        PERSONAL_DATA_EXPORT_PAGE_SIZE and PERSONAL_DATA_EXPORT_BATCH_SIZE
+    """
+    key = os.getenv('PERSONAL_DATA_EXPORT_KEY')
+    key = tuple(key.split(',')) if key else EXPORT_KEY
+    page_size = int(os.getenv('PERSONAL_DATA_EXPORT_PAGE_SIZE') or
+                    EXPORT_PAGE_SIZE)
+    batch_size = int(os.getenv('PERSONAL_DATA_EXPORT_BATCH_SIZE') or
+                     EXPORT_BATCH_SIZE)
+    template = None
+    for columns, row in stream_rows(db_connection, "users", key,
+                                    page_size, batch_size):
+        if template is None:
+            template = ';'.join(["{}={{}}".format(column)
+                                 for column in columns])
+        logger.info(template.format(*row))
+
+
 def main() -> None:
     """ Retrieves data from database tables and
         logs its while obfuscating sensitive fields
+        Set PERSONAL_DATA_EXPORT_MODE=stream to export large tables
+        without buffering the whole result set
     """
     db_connection = get_db()
+    if os.getenv('PERSONAL_DATA_EXPORT_MODE') == "stream":
+        export_users(db_connection, get_logger(asynchronous=True))
+        db_connection.close()
+        return
     cursor = db_connection.cursor(dictionary=True)
     cursor.execute("SELECT * FROM users;")
     logger = get_logger()
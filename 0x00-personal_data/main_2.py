@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Main file 2: streaming export against a local stand-in for MySQL
+"""
+import io
+import sqlite3
+import time
+import tracemalloc
+import mysql.connector as connector
+
+filtered_logger = __import__('filtered_logger')
+
+
+class StandInConnection:
+    """ In-memory SQLite database behind the subset of the
+        mysql.connector API the export uses
+        As with MySQL, one result at a time is read from the
+        connection: closing a cursor with rows left unread raises
+    """
+
+    def __init__(self):
+        self.db = sqlite3.connect(":memory:")
+        self.result = None
+
+    @property
+    def unread_result(self) -> bool:
+        """ True if a result has rows left to read """
+        return self.result is not None
+
+    def consume_results(self):
+        """ Reads the rows left of the current result """
+        self.result.fetchall()
+        self.result = None
+
+    def cursor(self, buffered: bool = False):
+        """ New cursor, reading rows from the connection unless
+            buffered
+        """
+        return StandInCursor(self, buffered)
+
+    def close(self):
+        """ Closes the database """
+        self.db.close()
+
+
+class StandInCursor:
+    """ Cursor taking %s placeholders """
+
+    def __init__(self, connection, buffered):
+        self.connection = connection
+        self.buffered = buffered
+        self.cursor = connection.db.cursor()
+
+    def execute(self, query: str, params: tuple = None):
+        """ Runs a query """
+        if self.connection.unread_result:
+            raise connector.errors.InternalError("Unread result found")
+        self.cursor.execute(query.replace("%s", "?"), params or ())
+        if self.buffered:
+            self.rows = self.cursor.fetchall()
+        else:
+            self.connection.result = self.cursor
+
+    @property
+    def description(self):
+        """ Columns of the last query """
+        return self.cursor.description
+
+    def fetchone(self):
+        """ Next row """
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size: int):
+        """ Next rows """
+        if self.buffered:
+            rows, self.rows = self.rows[:size], self.rows[size:]
+            return rows
+        rows = self.cursor.fetchmany(size)
+        if len(rows) < size:
+            self.connection.result = None
+        return rows
+
+    def close(self):
+        """ Closes the cursor """
+        if self.connection.result is self.cursor:
+            raise connector.errors.InternalError("Unread result found")
+        self.cursor.close()
+
+
+def users_db(count: int) -> StandInConnection:
+    """ users table of main.sql, without primary key, emails repeated
+        every 3 rows and null every 10 rows
+    """
+    connection = StandInConnection()
+    connection.db.execute("CREATE TABLE users (id INTEGER, name TEXT, "
+                          "email TEXT, phone TEXT, ssn TEXT, password TEXT, "
+                          "ip TEXT)")
+    connection.db.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i, "name{}".format(i),
+          None if i % 10 == 0 else "user{}@hbtn.io".format(i // 3),
+          "(473) 401-4253", "261-72-6780", "pwd", "::1")
+         for i in range(count)))
+    return connection
+
+
+def exported_ids(connection, **kwargs) -> list:
+    """ Ids of the rows streamed, or the error raised """
+    try:
+        return [row[0] for _, row in filtered_logger.stream_rows(
+            connection, "users", page_size=7, batch_size=3, **kwargs)]
+    except ValueError as e:
+        return "ValueError: {}".format(e)
+
+
+connection = users_db(100)
+print("one query:", exported_ids(connection) == list(range(100)))
+print("keyset on id:", exported_ids(connection, key=("id",)) ==
+      list(range(100)))
+print("keyset on email, nulls and duplicates:",
+      exported_ids(connection, key=("email",)))
+connection.db.execute("UPDATE users SET email = 'user' || (id / 3) || "
+                      "'@hbtn.io'")
+print("keyset on email, duplicates:",
+      exported_ids(connection, key=("email",)))
+connection.db.execute("UPDATE users SET email = 'user' || id || '@hbtn.io'")
+print("keyset on unique email:",
+      sorted(exported_ids(connection, key=("email",))) == list(range(100)))
+rows = filtered_logger.stream_rows(connection, "users", batch_size=3)
+next(rows)
+rows.close()
+print("stopped early, then:", exported_ids(connection) == list(range(100)))
+
+stream = io.StringIO()
+logger = filtered_logger.get_logger(stream=stream)
+filtered_logger.export_users(connection, logger)
+lines = stream.getvalue().splitlines()
+print("logged:", len(lines), "lines, redacted:",
+      all("name=***;email=***;phone=***;ssn=***;password=***;" in line
+          for line in lines))
+
+count = 200000
+connection = users_db(count)
+for key in ((), ("id",)):
+    connection.db.execute("DROP INDEX IF EXISTS ix_id")
+    if key:
+        connection.db.execute("CREATE INDEX ix_id ON users (id)")
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in filtered_logger.stream_rows(connection, "users", key):
+        pass
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("{} rows, key {}: {:.0f} rows/s, peak {:.1f} MiB".format(
+        count, key, count / elapsed, peak / 2 ** 20))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Main file 3: cost of a record after repeated get_logger calls, and
+handlers left behind by alternating configurations
+"""
+import io
+import os
+import threading
+import time
+
+get_logger = __import__('filtered_logger').get_logger
+
+MESSAGE = "name=Marlene Wood;email=hwestiii@att.net;phone=(473) 401-4253;" \
+    "ssn=261-72-6780;password=K5?BMNv;ip=60ed:c396:2ff:244:bbd0;"
+
+devnull = open(os.devnull, "w")
+calls = 0
+for target in (1, 10, 100, 1000):
+    while calls < target:
+        logger = get_logger(stream=devnull)
+        calls += 1
+    start = time.perf_counter()
+    for _ in range(10000):
+        logger.info(MESSAGE)
+    print("{} calls: {} handlers, {:.1f} us/record".format(
+        calls, len(logger.handlers),
+        (time.perf_counter() - start) / 10000 * 1e6))
+
+threads = threading.active_count()
+streams = []
+for i in range(200):
+    streams.append(io.StringIO())
+    logger = get_logger(stream=streams[-1], asynchronous=i % 2 == 0)
+    logger.info(MESSAGE)
+print("200 configurations: {} handlers, {} worker threads left".format(
+    len(logger.handlers), threading.active_count() - threads))
+print("every record written once:",
+      all(stream.getvalue().count("\n") == 1 for stream in streams))
+print(streams[-1].getvalue(), end="")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Main file 4: bulk_redactor against csv.DictReader and filter_datum,
+and the same output for any chunk size
+"""
+import csv
+import os
+import shutil
+import tempfile
+import time
+
+redact_file = __import__('bulk_redactor').redact_file
+filtered_logger = __import__('filtered_logger')
+
+ROWS = 400000
+
+directory = tempfile.mkdtemp()
+source = os.path.join(directory, "users.csv")
+with open("user_data.csv") as f:
+    header, *lines = f.read().splitlines(True)
+with open(source, "w") as f:
+    f.write(header)
+    for i in range(ROWS):
+        f.write(lines[i % len(lines)])
+size = os.path.getsize(source) / 2 ** 20
+
+start = time.perf_counter()
+with open(source) as f, open(os.path.join(directory, "log"), "w") as out:
+    for row in csv.DictReader(f):
+        message = ";".join("{}={}".format(k, v) for k, v in row.items())
+        out.write(filtered_logger.filter_datum(
+            filtered_logger.PII_FIELDS, "***", message, ";") + "\n")
+print("{:.0f} MiB, {} rows".format(size, ROWS))
+print("DictReader and filter_datum: {:.1f} MiB/s".format(
+    size / (time.perf_counter() - start)))
+for workers in sorted({1, 2, os.cpu_count()}):
+    start = time.perf_counter()
+    redact_file(source, os.path.join(directory, "{}.csv".format(workers)),
+                workers=workers, chunk_size=4 * 2 ** 20)
+    print("redact_file, {} workers: {:.1f} MiB/s".format(
+        workers, size / (time.perf_counter() - start)))
+
+quoted = os.path.join(directory, "quoted.csv")
+with open(quoted, "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["name", "email", "phone", "ssn", "password", "ip"])
+    for i in range(50):
+        writer.writerow(["Name\n{}".format(i), "a,\"b\"\n@c.io", "(473)",
+                         "261", "pwd\r\n", "::{}".format(i)])
+outputs = set()
+for chunk_size in (2 ** 20, 64, 7, 1):
+    destination = os.path.join(directory, "{}.out".format(chunk_size))
+    redact_file(quoted, destination, workers=2, chunk_size=chunk_size)
+    with open(destination, "rb") as f:
+        outputs.add(f.read())
+print("quoted newlines, chunks of 1 MiB to 1 byte: {} output(s)".format(
+    len(outputs)))
+
+dump = os.path.join(directory, "dump.sql")
+with open(dump, "w") as f:
+    f.write("CREATE TABLE `users` (\n  `name` varchar(256),\n"
+            "  `email` varchar(256),\n  `ip` varchar(64)\n);\n"
+            "INSERT INTO `users` VALUES ('Bob','bob@hbtn.io','::1'),"
+            "('Ann','ann@hbtn.io','::2');\n"
+            "INSERT INTO users (id, created, email, ip) VALUES "
+            "(1, NOW(), 'bob@x.io', '::1'), (2, NOW(), UPPER('ann@x.io'), "
+            "'::2');\n")
+redact_file(dump, dump + ".out")
+with open(dump + ".out") as f:
+    print("".join(f.read().splitlines(True)[-2:]), end="")
+with open(dump, "a") as f:
+    f.write("INSERT INTO `other` VALUES ('secret');\n")
+try:
+    redact_file(dump, dump + ".out")
+except ValueError as e:
+    print("ValueError:", e)
+shutil.rmtree(directory)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Main file 5: hash_passwords and verify_many throughput for 1 to N
+workers, threads and processes
+"""
+import os
+import time
+
+encrypt_password = __import__('encrypt_password')
+
+ROUNDS = 10
+PASSWORDS = ["password{}".format(i) for i in range(64)]
+
+if __name__ == "__main__":
+    hashed = encrypt_password.hash_passwords(PASSWORDS, ROUNDS)
+    print(os.cpu_count(), "CPU(s), cost factor", ROUNDS)
+    workers = 1
+    while True:
+        for processes in (False, True):
+            start = time.perf_counter()
+            encrypt_password.hash_passwords(PASSWORDS, ROUNDS, workers,
+                                            processes)
+            hashing = time.perf_counter() - start
+            start = time.perf_counter()
+            valid = encrypt_password.verify_many(hashed, PASSWORDS, workers,
+                                                 processes)
+            checking = time.perf_counter() - start
+            print("{} {}: {:.0f} hashes/s, {:.0f} checks/s, all valid: {}"
+                  .format(workers, "processes" if processes else "threads",
+                          len(PASSWORDS) / hashing, len(PASSWORDS) / checking,
+                          all(valid)))
+        if workers >= (os.cpu_count() or 1):
+            break
+        workers = min(workers * 2, os.cpu_count())
+
+    try:
+        encrypt_password.verify_many(hashed, PASSWORDS[1:])
+    except ValueError as e:
+        print("ValueError:", e)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Main file 6: closing a BatchingHandler while threads keep logging into
+its full queue, for each overflow policy
+"""
+import io
+import logging
+import threading
+import time
+
+BatchingHandler = __import__('filtered_logger').BatchingHandler
+
+RECORD = logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                           "name=Bob;", None, None)
+
+for overflow in BatchingHandler.OVERFLOW_POLICIES:
+    hangs = 0
+    for _ in range(20):
+        stream = io.StringIO()
+        handler = BatchingHandler(stream, capacity=4, batch_size=2,
+                                  overflow=overflow)
+        stop = threading.Event()
+
+        def emitter():
+            """ Logs until stopped """
+            while not stop.is_set():
+                handler.handle(RECORD)
+
+        threads = [threading.Thread(target=emitter, daemon=True)
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.01)
+        closer = threading.Thread(target=handler.close, daemon=True)
+        closer.start()
+        closer.join(2)
+        hangs += closer.is_alive()
+        stop.set()
+        for thread in threads:
+            thread.join(2)
+    lines = stream.getvalue().count("\n")
+    handler.handle(RECORD)
+    print("{}: {} of 20 closes hung, written after close: {}".format(
+        overflow, hangs, stream.getvalue().count("\n") == lines + 1))
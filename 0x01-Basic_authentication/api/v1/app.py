@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+from api.v1.auth.auth import ExcludedPaths
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -12,6 +13,9 @@ import os
 app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+excluded_paths = ExcludedPaths(['/api/v1/status/',
+                                '/api/v1/unauthorized/',
+                                '/api/v1/forbidden/'])
 auth = None
 auth_type = getenv('AUTH_TYPE')
 if auth_type == 'auth':
@@ -49,9 +53,7 @@ def before_request():
     """
     if not auth:
         return
-    if not auth.require_auth(request.path, ['/api/v1/status/',
-                                            '/api/v1/unauthorized/',
-                                            '/api/v1/forbidden/']):
+    if not auth.require_auth(request.path, excluded_paths):
         return
     if not auth.authorization_header(request):
         abort(401)
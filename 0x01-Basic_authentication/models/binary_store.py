@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+""" Binary store module
+    Compact snapshot format: a fixed schema given once in the header,
+    then length-prefixed fields for each record, the record ids and
+    an offsets table, read through a memory map.
+"""
+from array import array
+from typing import BinaryIO, Iterable, List, Tuple, Union
+import json
+import mmap
+import struct
+
+
+MAGIC = b"HBTNDB1\n"
+EXTRA = "__extra__"
+NONE, TEXT, JSON = 0, 1, 2
+UINT16 = struct.Struct("<H")
+UINT32 = struct.Struct("<I")
+TRAILER = struct.Struct("<QQQ")
+
+
+def encode_record(fields: List[str], record: dict) -> bytes:
+    """ Encode a JSON dictionary with the fields of a schema
+        Keys outside the schema are kept in the EXTRA field
+    """
+    parts = []
+    extra = {k: v for k, v in record.items() if k not in fields}
+    for name in fields:
+        value = (extra or None) if name == EXTRA else record.get(name)
+        if value is None:
+            parts.append(bytes((NONE,)))
+            continue
+        if type(value) is str:
+            tag, payload = TEXT, value.encode()
+        else:
+            tag, payload = JSON, json.dumps(value).encode()
+        parts.append(bytes((tag,)))
+        parts.append(UINT32.pack(len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def dump(f: BinaryIO, fields: Iterable[str],
+         records: Iterable[Tuple[str, Union[dict, bytes]]]) -> None:
+    """ Write records to a binary store file
+        Args:
+            - f: file opened in binary write mode
+            - fields: schema of the records
+            - records: (id, record) pairs, a record being a JSON
+                       dictionary or bytes already encoded with the
+                       same schema
+    """
+    fields = list(fields) + [EXTRA]
+    f.write(MAGIC)
+    f.write(UINT32.pack(len(fields)))
+    for name in fields:
+        name = name.encode()
+        f.write(UINT16.pack(len(name)))
+        f.write(name)
+    offsets = array("Q", [f.tell()])
+    ids = []
+    for obj_id, record in records:
+        if type(record) is not bytes:
+            record = encode_record(fields, record)
+        f.write(record)
+        offsets.append(offsets[-1] + len(record))
+        ids.append(obj_id)
+    ids_block = "\n".join(ids).encode()
+    f.write(ids_block)
+    offsets.tofile(f)
+    f.write(TRAILER.pack(offsets[-1], len(ids_block), len(ids)))
+    f.write(MAGIC)
+
+
+class MappedStore():
+    """ Read-only view of a binary store file
+        Only the ids and the offsets table are read when opened,
+        records are decoded on demand from the memory map
+    """
+
+    def __init__(self, file_path: str):
+        """ Map a binary store file
+        """
+        with open(file_path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self.mm
+        if mm[:len(MAGIC)] != MAGIC or mm[-len(MAGIC):] != MAGIC:
+            raise ValueError("Not a binary store: {}".format(file_path))
+        end = len(mm) - len(MAGIC) - TRAILER.size
+        ids_pos, ids_size, count = TRAILER.unpack_from(mm, end)
+
+        fields_count = UINT32.unpack_from(mm, len(MAGIC))[0]
+        pos = len(MAGIC) + UINT32.size
+        fields = []
+        for _ in range(fields_count):
+            size = UINT16.unpack_from(mm, pos)[0]
+            pos += UINT16.size
+            fields.append(mm[pos:pos + size].decode())
+            pos += size
+        self.fields = fields
+
+        ids_block = mm[ids_pos:ids_pos + ids_size].decode()
+        self.ids = ids_block.split("\n") if count else []
+        self.offsets = array("Q")
+        self.offsets.frombytes(mm[ids_pos + ids_size:end])
+
+    def raw(self, index: int) -> bytes:
+        """ Encoded bytes of a record
+        """
+        return self.mm[self.offsets[index]:self.offsets[index + 1]]
+
+    def record(self, index: int) -> dict:
+        """ Decode a record to its JSON dictionary
+        """
+        mm = self.mm
+        pos = self.offsets[index]
+        result = {}
+        for name in self.fields:
+            tag = mm[pos]
+            pos += 1
+            value = None
+            if tag != NONE:
+                size = UINT32.unpack_from(mm, pos)[0]
+                pos += UINT32.size
+                payload = mm[pos:pos + size]
+                pos += size
+                value = payload.decode() if tag == TEXT \
+                    else json.loads(payload)
+            if name == EXTRA:
+                result.update(value or {})
+            else:
+                result[name] = value
+        return result
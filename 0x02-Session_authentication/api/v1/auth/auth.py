@@ -2,23 +2,74 @@
 """ Module of API authentication management
 """
 from flask import request
-from typing import List, TypeVar, Optional
+import re
+from typing import List, TypeVar, Optional, Union
 from os import getenv
 
 
+class ExcludedPaths:
+    """ Paths not requiring authentication, compiled once
+        A path ending with * excludes every path starting with the
+        rest of it, other paths are matched with or without their
+        trailing slash. The paths are merged in a prefix trie turned
+        into a single regular expression, so a match costs the same
+        for any number of paths.
+    """
+    def __init__(self, paths: List[str]):
+        """ Compile the excluded paths
+        """
+        self.paths = list(paths)
+        trie = {}
+        for path in self.paths:
+            prefix = path.endswith('*')
+            path = path.rstrip('*') if prefix else path.rstrip('/') + '/'
+            node = trie
+            for char in path:
+                node = node.setdefault(char, {})
+            node[''] = prefix or node.get('', False)
+        self.pattern = re.compile(self._pattern(trie))
+
+    def __bool__(self) -> bool:
+        """ True if any path is excluded
+        """
+        return len(self.paths) > 0
+
+    def match(self, path: str) -> bool:
+        """ Check if path is excluded, path ending with a slash
+        """
+        return self.pattern.match(path) is not None
+
+    @classmethod
+    def _pattern(cls, node: dict) -> str:
+        """ Regular expression matching the paths of a trie node
+        """
+        if node.get(''):
+            return ''
+        alternatives = ['$'] if '' in node else []
+        for char in sorted(k for k in node if k):
+            alternatives.append(re.escape(char) + cls._pattern(node[char]))
+        if not alternatives:
+            return '(?!)'
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return '(?:{})'.format('|'.join(alternatives))
+
+
 class Auth:
     """ Class to handle authentication
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExcludedPaths]) -> bool:
         """ Check if authentication is required to access path
+            excluded_paths should be compiled once in an ExcludedPaths,
+            a list is compiled on each call
         """
         if not excluded_paths or not path:
             return True
+        if not isinstance(excluded_paths, ExcludedPaths):
+            excluded_paths = ExcludedPaths(excluded_paths)
         path = path if path.endswith('/') else path + '/'
-        for excluded_path in excluded_paths:
-            if path.startswith(excluded_path.strip("*")):
-                return False
-        return True
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> Optional[str]:
         """ Get the authorization header from the request
@@ -3,15 +3,40 @@
 Basic authentication module
 """
 import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
 from api.v1.auth.auth import Auth
 from base64 import b64decode
+from collections import OrderedDict
 from models.user import User
 from typing import Optional, Tuple, TypeVar
 
 
 class BasicAuth(Auth):
     """ Basic authentication class
+        Verified Authorization headers are cached, keyed by their HMAC
+        under a per process key, with the id of their user: at most
+        BASIC_AUTH_CACHE_SIZE entries (1024 by default, 0 to disable)
+        for BASIC_AUTH_CACHE_TTL seconds (300 by default)
     """
+    credentials_cache = OrderedDict()
+    credentials_cache_lock = threading.Lock()
+    credentials_cache_key = os.urandom(32)
+
+    def __init__(self) -> None:
+        """ Initialize BasicAuth instance
+        """
+        super().__init__()
+        try:
+            self.cache_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+            self.cache_ttl = float(os.getenv('BASIC_AUTH_CACHE_TTL', 300))
+        except ValueError:
+            self.cache_size = 1024
+            self.cache_ttl = 300
+
     def extract_base64_authorization_header(self, authorization_header:
                                             str) -> str:
         """ Retrieves authentication parameters form authorization header
@@ -68,8 +93,53 @@ class BasicAuth(Auth):
         """ Returns current user object
         """
         auth_header = self.authorization_header(request)
+        cache_key = None
+        if self.cache_size > 0 and auth_header:
+            cache_key = hmac.new(BasicAuth.credentials_cache_key,
+                                 auth_header.encode(),
+                                 hashlib.sha256).digest()
+            user = self.cached_user(cache_key)
+            if user is not None:
+                return user
         b64_str = self.extract_base64_authorization_header(auth_header)
         decode_b64_str = self.decode_base64_authorization_header(b64_str)
         email, pwd = self.extract_user_credentials(decode_b64_str)
         user = self.user_object_from_credentials(email, pwd)
+        if user is not None and cache_key is not None:
+            self.cache_user(cache_key, user)
         return user
+
+    def cached_user(self, cache_key: bytes) -> TypeVar('User'):
+        """ Returns the user of a cached Authorization header
+            The entry is dropped once expired, or if its user was
+            removed or changed email or password since
+        """
+        with BasicAuth.credentials_cache_lock:
+            entry = BasicAuth.credentials_cache.get(cache_key)
+            if entry is None:
+                return None
+            BasicAuth.credentials_cache.move_to_end(cache_key)
+        user_id, email, password, expires_at = entry
+        try:
+            user = User.get(user_id)
+        except KeyError:
+            user = None
+        if user is not None and user.email == email and \
+                user.password == password and time.monotonic() < expires_at:
+            return user
+        with BasicAuth.credentials_cache_lock:
+            BasicAuth.credentials_cache.pop(cache_key, None)
+        return None
+
+    def cache_user(self, cache_key: bytes, user: TypeVar('User')) -> None:
+        """ Caches the user of a verified Authorization header, with its
+            email and the hash of its password to notice a change of
+            the credentials
+        """
+        entry = (user.id, user.email, user.password,
+                 time.monotonic() + self.cache_ttl)
+        with BasicAuth.credentials_cache_lock:
+            BasicAuth.credentials_cache[cache_key] = entry
+            BasicAuth.credentials_cache.move_to_end(cache_key)
+            while len(BasicAuth.credentials_cache) > self.cache_size:
+                BasicAuth.credentials_cache.popitem(last=False)
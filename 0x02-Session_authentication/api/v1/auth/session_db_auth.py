@@ -4,13 +4,52 @@ Module of session storage
 """
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from datetime import datetime, timedelta
+from models import base
 from models.user_session import UserSession
+from os import getenv
+from typing import List
+import atexit
+import threading
+import time
 
 
 class SessionDBAuth(SessionExpAuth):
     """ Session class for storable and persistent
         sessions
+        user_id_by_session_id caches the sessions read from the
+        store, as {"user_id", "created_at"} dictionaries
+        In sliding mode, the last request time of sessions is kept in
+        session_touches and written to the store in one batch every
+        SESSION_TOUCH_INTERVAL seconds (60 by default), or as soon as
+        SESSION_TOUCH_BATCH sessions (1000 by default) are pending
+        With MODELS_PERSISTENCE=shared, cached sessions are checked
+        against the store, which other processes may have changed
     """
+    session_touches = {}
+    session_touches_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        """ Initialize SessionDBAuth instance, loading the sessions
+            already stored and scheduling their expiry
+        """
+        super().__init__()
+        try:
+            self.touch_interval = float(getenv('SESSION_TOUCH_INTERVAL', 60))
+            self.touch_batch = int(getenv('SESSION_TOUCH_BATCH', 1000))
+        except ValueError:
+            self.touch_interval = 60
+            self.touch_batch = 1000
+        if self.sliding and self.session_duration > 0:
+            atexit.register(self.flush_touches)
+            if self.touch_interval > 0:
+                threading.Thread(target=self._flush_forever,
+                                 daemon=True).start()
+        UserSession.load_from_file()
+        if self._reaper is None:
+            return
+        for session in UserSession.all():
+            self._schedule_expiry(session.session_id, session.updated_at)
+
     def create_session(self, user_id: str = None) -> str:
         """ Creates session object
             Return:
@@ -21,32 +60,46 @@ class SessionDBAuth(SessionExpAuth):
 
         session = UserSession(**{"user_id": user_id})
         session.save()
-        SessionDBAuth.user_id_by_session_id[session.session_id] =\
-            session.user_id
+        SessionDBAuth.user_id_by_session_id[session.session_id] = {
+            "user_id": session.user_id, "created_at": session.updated_at}
+        self._schedule_expiry(session.session_id, session.updated_at)
         return session.session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """ Get user by session id
+            Sessions are read from the store on a cache miss, through
+            the session_id index
         """
         if not session_id or type(session_id) is not str:
             return None
-        try:
-            sessions = UserSession.search({"session_id": session_id})
-        except KeyError:
-            return None
-        if not sessions:
-            return None
-        session = sessions[0]
+        session_info = SessionDBAuth.user_id_by_session_id.get(session_id)
+        if session_info is None or base.PERSISTENCE == "shared":
+            try:
+                session = UserSession.find("session_id", session_id)
+            except KeyError:
+                return None
+            if session is None:
+                SessionDBAuth.user_id_by_session_id.pop(session_id, None)
+                return None
+            if session_info is None:
+                session_info = {"user_id": session.user_id,
+                                "created_at": session.updated_at}
+                SessionDBAuth.user_id_by_session_id[session_id] = \
+                    session_info
+            elif session_info["created_at"] < session.updated_at:
+                session_info["created_at"] = session.updated_at
 
         if self.session_duration <= 0:
-            return session.user_id
+            return session_info["user_id"]
 
-        expiry_date = session.updated_at \
+        expiry_date = session_info["created_at"] \
             + timedelta(seconds=self.session_duration)
-        if datetime.utcnow() < expiry_date:
-            return session.user_id
-        SessionDBAuth.user_id_by_session_id.pop(session_id)
-        session.remove()
+        now = datetime.utcnow()
+        if now < expiry_date:
+            if self.sliding:
+                self._touch(session_id, session_info, now)
+            return session_info["user_id"]
+        self._forget_session(session_id)
         return None
 
     def destroy_session(self, request=None) -> bool:
@@ -55,14 +108,112 @@ class SessionDBAuth(SessionExpAuth):
         if not request:
             return False
         session_id = self.session_cookie(request)
+        if not session_id:
+            return False
+        return self._forget_session(session_id)
+
+    def _forget_session(self, session_id: str) -> bool:
+        """ Drop a session from the cache and the store
+            Return:
+                - True if the session was stored
+        """
+        SessionDBAuth.user_id_by_session_id.pop(session_id, None)
+        with SessionDBAuth.session_touches_lock:
+            SessionDBAuth.session_touches.pop(session_id, None)
         try:
-            sessions = UserSession.search({"session_id": session_id})
+            session = UserSession.find("session_id", session_id)
         except KeyError:
             return False
+        if session is None:
+            return False
+        session.remove()
+        return True
+
+    def _session_expiry(self, session_id: str) -> datetime:
+        """ Current expiry date of a session, None if it is gone
+        """
+        session_info = SessionDBAuth.user_id_by_session_id.get(session_id)
+        if type(session_info) is dict and base.PERSISTENCE != "shared":
+            start = session_info["created_at"]
+        else:
+            try:
+                session = UserSession.find("session_id", session_id)
+            except KeyError:
+                return None
+            if session is None:
+                return None
+            start = session.updated_at
+            if type(session_info) is dict:
+                start = max(start, session_info["created_at"])
+        return start + timedelta(seconds=self.session_duration)
+
+    def _remove_sessions(self, session_ids: List[str]) -> None:
+        """ Removes expired sessions from the cache and the store,
+            written to the store at once
+        """
+        obj_ids = []
+        with SessionDBAuth.session_touches_lock:
+            for session_id in session_ids:
+                SessionDBAuth.session_touches.pop(session_id, None)
+        for session_id in session_ids:
+            SessionDBAuth.user_id_by_session_id.pop(session_id, None)
+            session = UserSession.find("session_id", session_id)
+            if session is not None:
+                obj_ids.append(session.id)
+        UserSession.remove_many(obj_ids)
+
+    def _now(self) -> datetime:
+        """ Current date, as session dates are stored
+        """
+        return datetime.utcnow()
 
-        if sessions:
-            session = sessions[0]
-            SessionDBAuth.user_id_by_session_id.pop(session.session_id)
-            session.remove()
-            return True
-        return False
+    def flush_touches(self) -> int:
+        """ Writes the pending last request times to the store, with
+            one write for all the sessions
+            If the store fails, the times are pending again for the
+            next flush and the error is raised
+            Return:
+                - number of sessions written
+        """
+        with SessionDBAuth.session_touches_lock:
+            touches = SessionDBAuth.session_touches
+            SessionDBAuth.session_touches = {}
+        sessions = []
+        try:
+            for session_id, last_seen in touches.items():
+                session = UserSession.find("session_id", session_id)
+                if session is not None and \
+                        session.updated_at <= last_seen:
+                    session.updated_at = last_seen
+                    sessions.append(session)
+            UserSession.save_many(sessions, touch=False)
+        except Exception:
+            with SessionDBAuth.session_touches_lock:
+                for session_id, last_seen in touches.items():
+                    SessionDBAuth.session_touches.setdefault(session_id,
+                                                             last_seen)
+            raise
+        return len(sessions)
+
+    def _touch(self, session_id: str, session_info: dict,
+               now: datetime) -> None:
+        """ Slides the expiry of a session in memory and queues the
+            write of its last request time
+        """
+        session_info["created_at"] = now
+        with SessionDBAuth.session_touches_lock:
+            SessionDBAuth.session_touches[session_id] = now
+            pending = len(SessionDBAuth.session_touches)
+        if pending >= self.touch_batch:
+            self.flush_touches()
+
+    def _flush_forever(self) -> None:
+        """ Flush loop, one batch every touch_interval seconds
+            A failed batch is retried on the next one
+        """
+        while True:
+            time.sleep(self.touch_interval)
+            try:
+                self.flush_touches()
+            except Exception:
+                pass
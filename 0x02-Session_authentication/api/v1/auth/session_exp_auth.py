@@ -5,11 +5,23 @@ Module of expiring session
 from api.v1.auth.session_auth import SessionAuth
 from datetime import datetime, timedelta
 from os import getenv
+from typing import List
+import heapq
+import threading
+import time
 
 
 class SessionExpAuth(SessionAuth):
     """ Expiring session class
+        Expired sessions are removed every SESSION_REAP_INTERVAL
+        seconds (60 by default, 0 to disable) by a background reaper
+        popping them from a heap ordered by expiry date
+        With SESSION_SLIDING=1, expiry is measured from the last
+        request of the session instead of its creation
     """
+    session_expiries = []
+    session_expiries_lock = threading.Lock()
+
     def __init__(self) -> None:
         """ Initialize SessionExpAuth instance
         """
@@ -23,6 +35,16 @@ class SessionExpAuth(SessionAuth):
                 self.session_duration = duration
             except ValueError:
                 self.session_duration = 0
+        self.sliding = getenv('SESSION_SLIDING', '0') == '1'
+        try:
+            self.reap_interval = float(getenv('SESSION_REAP_INTERVAL', 60))
+        except ValueError:
+            self.reap_interval = 60
+        self._reaper = None
+        if self.session_duration > 0 and self.reap_interval > 0:
+            self._reaper = threading.Thread(target=self._reap_forever,
+                                            daemon=True)
+            self._reaper.start()
 
     def create_session(self, user_id: str = None) -> str:
         """ Gets session_id from parent class method
@@ -39,6 +61,7 @@ class SessionExpAuth(SessionAuth):
         created_at = datetime.now()
         session_dict = {"user_id": user_id, "created_at": created_at}
         SessionExpAuth.user_id_by_session_id.update({session_id: session_dict})
+        self._schedule_expiry(session_id, created_at)
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -58,6 +81,75 @@ class SessionExpAuth(SessionAuth):
         if not created_at:
             return None
         expiry_date = created_at + timedelta(seconds=self.session_duration)
-        if datetime.now() > expiry_date:
+        now = datetime.now()
+        if now > expiry_date:
             return None
+        if self.sliding:
+            session_info["created_at"] = now
         return user_id
+
+    def reap_expired_sessions(self) -> int:
+        """ Removes the sessions expired by now, in O(expired) work
+            A popped session that was extended meanwhile is pushed
+            back with its current expiry date
+            Return:
+                - number of sessions removed
+        """
+        now = self._now()
+        expired = []
+        with SessionExpAuth.session_expiries_lock:
+            heap = SessionExpAuth.session_expiries
+            while heap and heap[0][0] <= now:
+                session_id = heapq.heappop(heap)[1]
+                expiry_date = self._session_expiry(session_id)
+                if expiry_date is None:
+                    continue
+                if expiry_date > now:
+                    heapq.heappush(heap, (expiry_date, session_id))
+                else:
+                    expired.append(session_id)
+        if expired:
+            self._remove_sessions(expired)
+        return len(expired)
+
+    def _schedule_expiry(self, session_id: str, start: datetime) -> None:
+        """ Adds a session started at start to the expiry heap
+        """
+        if self.session_duration <= 0:
+            return
+        expiry_date = start + timedelta(seconds=self.session_duration)
+        with SessionExpAuth.session_expiries_lock:
+            heapq.heappush(SessionExpAuth.session_expiries,
+                           (expiry_date, session_id))
+
+    def _session_expiry(self, session_id: str) -> datetime:
+        """ Current expiry date of a session, None if it is gone
+        """
+        session_info = SessionExpAuth.user_id_by_session_id.get(session_id)
+        if type(session_info) is not dict or \
+                not session_info.get("created_at"):
+            return None
+        return session_info["created_at"] \
+            + timedelta(seconds=self.session_duration)
+
+    def _remove_sessions(self, session_ids: List[str]) -> None:
+        """ Removes expired sessions
+        """
+        for session_id in session_ids:
+            SessionExpAuth.user_id_by_session_id.pop(session_id, None)
+
+    def _now(self) -> datetime:
+        """ Current date, as session dates are stored
+        """
+        return datetime.now()
+
+    def _reap_forever(self) -> None:
+        """ Reaper loop, one tick every reap_interval seconds
+            A failed tick is retried on the next one
+        """
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap_expired_sessions()
+            except Exception:
+                pass
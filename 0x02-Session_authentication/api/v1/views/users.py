@@ -2,18 +2,70 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from base64 import b64decode, urlsafe_b64encode
+from flask import Response, abort, jsonify, request, stream_with_context
+from itertools import islice
 from models.user import User
 
 
+USERS_CHUNK_SIZE = 1000
+USERS_MAX_LIMIT = 1000
+
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users, up to USERS_MAX_LIMIT
+      - after: cursor of the page to return, from X-Next-Cursor
+      - email (or any indexed User attribute): equality filter
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, ordered by id and
+        streamed in chunks of USERS_CHUNK_SIZE users
+      - X-Next-Cursor header if a limit is given and users remain
+      - 400 if limit or after is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    attributes = {k: request.args.get(k) for k in User.INDEXED_ATTRIBUTES
+                  if request.args.get(k) is not None}
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = b64decode(after + '=' * (-len(after) % 4),
+                              altchars=b'-_', validate=True).decode()
+        except ValueError:
+            after = ''
+        if not after:
+            return jsonify({'error': "Wrong cursor"}), 400
+    users = User.iterate(after, attributes)
+    headers = {}
+    if request.args.get('limit') is not None:
+        try:
+            limit = int(request.args.get('limit'))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': "Wrong limit"}), 400
+        limit = min(limit, USERS_MAX_LIMIT)
+        users = list(islice(users, limit + 1))
+        if len(users) > limit:
+            users.pop()
+            cursor = urlsafe_b64encode(users[-1].id.encode()).decode()
+            headers['X-Next-Cursor'] = cursor.rstrip('=')
+        users = iter(users)
+
+    def generate():
+        yield '['
+        separator = ''
+        chunk = list(islice(users, USERS_CHUNK_SIZE))
+        while chunk:
+            yield separator + ','.join(user.to_json_string()
+                                       for user in chunk)
+            separator = ','
+            chunk = list(islice(users, USERS_CHUNK_SIZE))
+        yield ']\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/json', headers=headers)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+""" Main 10
+    Lookup and Basic auth request latency with 1k, 100k and 1M users:
+    searches on the email index against a scan of first_name, which is
+    not indexed, as every search was before
+    Run as: ./main_10.py [numbers of users]
+"""
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SIZES = (1000, 100000, 1000000)
+LOOKUPS = 100
+SCANS = 5
+
+
+def write_users(count):
+    """ Writes the file of count users, with password "pwd" """
+    password = hashlib.sha256(b"pwd").hexdigest()
+    with open(".db_User.json", "w") as f:
+        json.dump({"user-{:07d}".format(i): {
+            "id": "user-{:07d}".format(i),
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00",
+            "email": "user{}@hbtn.io".format(i), "_password": password,
+            "first_name": "Bob{}".format(i), "last_name": None}
+            for i in range(count)}, f)
+
+
+def timed(operation, values):
+    """ Microseconds per call of operation """
+    start = time.perf_counter()
+    for value in values:
+        operation(value)
+    return (time.perf_counter() - start) * 1e6 / len(values)
+
+
+def benchmark(count):
+    """ Microseconds per lookup and request with count users stored """
+    write_users(count)
+    from api.v1.app import app
+    from models.user import User
+    User.load_from_file()
+    client = app.test_client()
+    numbers = range(0, count, count // LOOKUPS)
+
+    def request(number):
+        """ GET /api/v1/users/me as user number """
+        credentials = "user{}@hbtn.io:pwd".format(number).encode()
+        response = client.get("/api/v1/users/me", headers={
+            "Authorization": "Basic " +
+            base64.b64encode(credentials).decode()})
+        assert response.status_code == 200
+
+    return {"search email": timed(
+                lambda i: User.search({"email": "user{}@hbtn.io".format(i)}),
+                numbers),
+            "scan first_name": timed(
+                lambda i: User.search({"first_name": "Bob{}".format(i)}),
+                numbers[:SCANS]),
+            "request": timed(request, numbers)}
+
+
+def run(count):
+    """ Runs the benchmark in another process, in an empty directory """
+    env = dict(os.environ, AUTH_TYPE="basic_auth")
+    with tempfile.TemporaryDirectory() as directory:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "benchmark",
+             str(count)], env=env, cwd=directory, check=True,
+            stdout=subprocess.PIPE)
+    return json.loads(output.stdout)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["benchmark"]:
+        print(json.dumps(benchmark(int(sys.argv[2]))))
+    else:
+        sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+        print("us per operation")
+        for count in sizes:
+            timings = run(count)
+            print("{:>8} users: {}".format(count, ", ".join(
+                "{} {:.0f}".format(name, timing)
+                for name, timing in timings.items())))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Main 11
+    Startup with 100k and 1M users, eager against lazy loading
+    (MODELS_LAZY_LOAD=1): time of User.load_from_file, of the first
+    get and search after it, and peak memory of the process
+    Run as: ./main_11.py [numbers of users]
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+write_users = __import__('main_10').write_users
+
+SCRIPT = os.path.abspath(__file__)
+SIZES = (100000, 1000000)
+
+
+def startup(count):
+    """ Seconds to load then get and search a user, and peak memory """
+    from models.user import User
+    timings = {}
+    start = time.perf_counter()
+    User.load_from_file()
+    timings["load"] = time.perf_counter() - start
+    start = time.perf_counter()
+    user = User.get("user-{:07d}".format(count // 2))
+    timings["first get"] = time.perf_counter() - start
+    start = time.perf_counter()
+    assert User.search({"email": user.email}) == [user]
+    timings["first search"] = time.perf_counter() - start
+    timings["peak MiB"] = \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return timings
+
+
+def run(count, lazy):
+    """ Runs startup in another process """
+    env = dict(os.environ, MODELS_LAZY_LOAD="1" if lazy else "0")
+    output = subprocess.run(
+        [sys.executable, SCRIPT, "startup", str(count)],
+        env=env, check=True, stdout=subprocess.PIPE)
+    return json.loads(output.stdout)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["startup"]:
+        print(json.dumps(startup(int(sys.argv[2]))))
+    else:
+        sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            for count in sizes:
+                write_users(count)
+                for lazy in (False, True):
+                    timings = run(count, lazy)
+                    print("{:>8} users, {}: {}".format(
+                        count, "lazy" if lazy else "eager", ", ".join(
+                            "{} {:.3f}".format(name, value)
+                            for name, value in timings.items())))
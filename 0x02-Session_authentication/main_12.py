@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+""" Main 12
+    File size, load and save time of the JSON and binary storage
+    formats (MODELS_STORAGE_FORMAT), eager and lazy, and conversion
+    time between them
+    Run as: ./main_12.py [numbers of users]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+write_users = __import__('main_10').write_users
+
+SCRIPT = os.path.abspath(__file__)
+SIZES = (100000, 1000000)
+
+
+def timed(operation) -> float:
+    """ Seconds of a call of operation """
+    start = time.perf_counter()
+    operation()
+    return time.perf_counter() - start
+
+
+def convert(source_format, target_format):
+    """ Seconds to convert the file of User """
+    from models.user import User
+    return {"convert": timed(lambda: User.convert_file(source_format,
+                                                       target_format))}
+
+
+def measure():
+    """ Seconds to load then save every user """
+    from models.user import User
+    return {"load": timed(User.load_from_file),
+            "save": timed(User.save_to_file)}
+
+
+def run(*args, **env):
+    """ Runs this script in another process, with more variables """
+    output = subprocess.run(
+        [sys.executable, SCRIPT] + list(args), env=dict(os.environ, **env),
+        check=True, stdout=subprocess.PIPE)
+    return json.loads(output.stdout)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["convert"]:
+        print(json.dumps(convert(*sys.argv[2:4])))
+    elif sys.argv[1:2] == ["measure"]:
+        print(json.dumps(measure()))
+    else:
+        sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            for count in sizes:
+                write_users(count)
+                to_binary = run("convert", "json", "binary")["convert"]
+                os.rename(".db_User.json", "users.json")
+                to_json = run("convert", "binary", "json")["convert"]
+                os.replace("users.json", ".db_User.json")
+                print("{} users: converted to binary in {:.2f} s, back "
+                      "to JSON in {:.2f} s".format(count, to_binary,
+                                                   to_json))
+                for storage_format in ("json", "binary"):
+                    size = os.path.getsize(".db_User.{}".format(
+                        "bin" if storage_format == "binary" else "json"))
+                    for lazy in ("0", "1"):
+                        timings = run("measure",
+                                      MODELS_STORAGE_FORMAT=storage_format,
+                                      MODELS_LAZY_LOAD=lazy)
+                        print("  {:>6} {:.1f} MiB, {}: load {:.2f} s, save "
+                              "{:.2f} s".format(
+                                  storage_format, size / 2 ** 20,
+                                  "lazy" if lazy == "1" else "eager",
+                                  timings["load"], timings["save"]))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+""" Main 13
+    p50 and p99 latency and peak memory of GET /api/v1/users with 10k
+    and 100k users, streamed against the list passed to jsonify as
+    before
+    Run as: ./main_13.py [numbers of users]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+write_users = __import__('main_10').write_users
+
+SCRIPT = os.path.abspath(__file__)
+SIZES = (10000, 100000)
+REQUESTS = 20
+
+
+def percentiles(operation) -> dict:
+    """ p50 and p99 milliseconds of operation, then its peak MiB """
+    latencies = []
+    for _ in range(REQUESTS):
+        start = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"p50 ms": latencies[len(latencies) // 2],
+            "p99 ms": latencies[int(0.99 * (len(latencies) - 1))],
+            "peak MiB": peak / 2 ** 20}
+
+
+def benchmark(count):
+    """ Latency and memory of the streamed and jsonify responses """
+    from api.v1.app import app
+    from flask import jsonify
+    from models.user import User
+    write_users(count)
+    User.load_from_file()
+    client = app.test_client()
+
+    def streamed():
+        """ GET /api/v1/users, read chunk by chunk """
+        response = client.get("/api/v1/users", buffered=False)
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    def listed():
+        """ Previous view: the list of every user to jsonify """
+        with app.test_request_context("/api/v1/users"):
+            return jsonify([user.to_json() for user in User.all()]) \
+                .get_data()
+
+    assert json.loads(client.get("/api/v1/users").get_data()) == \
+        json.loads(listed())
+    return {"streamed": percentiles(streamed),
+            "jsonify": percentiles(listed)}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["benchmark"]:
+        print(json.dumps(benchmark(int(sys.argv[2]))))
+    else:
+        sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+        for count in sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                output = subprocess.run(
+                    [sys.executable, SCRIPT, "benchmark", str(count)],
+                    cwd=directory, check=True, stdout=subprocess.PIPE)
+            for name, values in json.loads(output.stdout).items():
+                print("{:>7} users, {}: {}".format(count, name, ", ".join(
+                    "{} {:.1f}".format(key, value)
+                    for key, value in values.items())))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+""" Main 5
+"""
+from api.v1.auth.session_db_auth import SessionDBAuth
+import json
+import os
+import time
+
+os.environ["SESSION_DURATION"] = "60"
+os.environ["SESSION_SLIDING"] = "1"
+os.environ["SESSION_TOUCH_BATCH"] = "3"
+os.environ["SESSION_TOUCH_INTERVAL"] = "0"
+os.environ["SESSION_REAP_INTERVAL"] = "0"
+
+
+def stored_updated_at(session_id):
+    """ updated_at of a session, as written in the file """
+    with open(".db_UserSession.json") as f:
+        for session in json.load(f).values():
+            if session["session_id"] == session_id:
+                return session["updated_at"]
+
+
+sa = SessionDBAuth()
+session_ids = [sa.create_session("user{}".format(i)) for i in range(3)]
+created = [stored_updated_at(session_id) for session_id in session_ids]
+time.sleep(1)
+
+""" Touches stay in memory until the batch is full """
+sa.user_id_for_session_id(session_ids[0])
+sa.user_id_for_session_id(session_ids[1])
+print("Pending: {}".format(len(SessionDBAuth.session_touches)))
+print("Written: {}".format(stored_updated_at(session_ids[0]) != created[0]))
+
+""" The third touch flushes the batch in one write """
+sa.user_id_for_session_id(session_ids[2])
+print("Pending: {}".format(len(SessionDBAuth.session_touches)))
+print("Written: {}".format(all(stored_updated_at(session_id) != date
+                               for session_id, date
+                               in zip(session_ids, created))))
+
+""" Nothing left to flush """
+print("Flushed: {}".format(sa.flush_touches()))
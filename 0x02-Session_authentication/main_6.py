@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+""" Main 6
+"""
+from api.v1.auth.auth import Auth, ExcludedPaths
+import timeit
+
+a = Auth()
+
+for count in (4, 400):
+    paths = ["/api/v1/public{}/".format(i) for i in range(count - 1)]
+    paths.append("/api/v1/stat*")
+    excluded_paths = ExcludedPaths(paths)
+    for path in ("/api/v1/users", "/api/v1/status"):
+        assert a.require_auth(path, paths) == \
+            a.require_auth(path, excluded_paths)
+        seconds = timeit.timeit(lambda: a.require_auth(path, excluded_paths),
+                                number=100000)
+        print("{} paths, {}: {:.2f} us".format(count, path, seconds * 10))
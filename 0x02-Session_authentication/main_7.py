@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" Main 7
+"""
+from models.base import INDEXES
+from models.user import User
+import sys
+import threading
+import time
+
+""" Stress test: threads creating, updating and removing users while
+    others read them
+    A sleep is added before each index and journal update, so that
+    other threads run between them and the store update they follow
+    unless the store lock keeps them out """
+User.load_from_file()
+errors = []
+switch_interval = sys.getswitchinterval()
+sys.setswitchinterval(1e-6)
+
+
+def widened(method):
+    """ Calls method after a sleep """
+    def wrapper(*args):
+        time.sleep(0.0005)
+        return method(*args)
+    return staticmethod(wrapper)
+
+
+User._index = widened(User._index)
+User._append_journal = widened(User._append_journal)
+
+
+def writer(number):
+    """ Creates, updates then removes users """
+    try:
+        for i in range(100):
+            user = User(email="stress{}@hbtn.io".format(i % 10))
+            user.save()
+            user.first_name = "Bob"
+            user.save()
+            if i % 2:
+                user.remove()
+    except Exception as e:
+        errors.append(e)
+
+
+def reader():
+    """ Reads users while they change """
+    try:
+        for i in range(200):
+            email = "stress{}@hbtn.io".format(i % 10)
+            for user in User.search({"email": email}):
+                user.to_json()
+            User.find("email", email)
+            User.count()
+            list(User.iterate())
+    except Exception as e:
+        errors.append(e)
+
+
+def racing(user, operation):
+    """ Runs an operation of a user """
+    try:
+        operation(user)
+    except Exception as e:
+        errors.append(e)
+
+
+threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+threads += [threading.Thread(target=reader) for i in range(8)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+""" A save racing a removal of the same user, 100 times """
+for i in range(100):
+    user = User(email="race{}@hbtn.io".format(i))
+    user.save()
+    threads = [threading.Thread(target=racing, args=(user, operation))
+               for operation in (User.save, User.remove)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+del User._index, User._append_journal
+sys.setswitchinterval(switch_interval)
+indexed = {user_id for users in INDEXES["User"]["email"].values()
+           for user_id in users}
+ordered = [user.id for user in User.iterate()]
+in_memory = {user.id: user.to_json(True) for user in User.all()}
+User.load_from_file()
+stored = {user.id: user.to_json(True) for user in User.all()}
+print("Errors: {}".format(errors))
+print("Stored users: {}".format(len(stored)))
+print("File matches store: {}".format(stored == in_memory))
+print("Index matches store: {}".format(indexed == set(in_memory)))
+print("Order matches store: {}".format(ordered == sorted(in_memory)))
+
+""" Throughput: 9 reads for 1 save """
+for count in (1, 2, 4, 8, 16, 32):
+    users = User.search()
+    done = []
+
+    def worker(number):
+        """ Runs operations for one second """
+        operations = 0
+        end = time.monotonic() + 1
+        while time.monotonic() < end:
+            user = users[(number * 7919 + operations) % len(users)]
+            if operations % 10 == 9:
+                user.save()
+            else:
+                User.search({"email": user.email})
+            operations += 1
+        done.append(operations)
+
+    threads = [threading.Thread(target=worker, args=(i,))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print("{} threads: {} operations/s".format(count, sum(done)))
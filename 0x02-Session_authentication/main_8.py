@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Main 8
+    Run as: MODELS_PERSISTENCE=shared MODELS_JOURNAL_SIZE=65536 ./main_8.py
+"""
+from models.user import User
+import multiprocessing
+import time
+
+""" Processes sharing the store, as gunicorn workers: each one creates
+    and removes users and must see those of the others """
+
+
+def worker(number, seconds, results):
+    """ Runs operations for some seconds, 9 reads for 1 save """
+    User.load_from_file()
+    operations = 0
+    created = []
+    lost = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if operations % 10 == 9:
+            user = User(email="worker{}-{}@hbtn.io".format(number,
+                                                           operations))
+            user.save()
+            created.append(user.id)
+            if len(created) > 20:
+                user = User.get(created.pop(0))
+                if user is None:
+                    lost += 1
+                else:
+                    user.remove()
+        else:
+            User.search({"email": "worker0-9@hbtn.io"})
+            User.count()
+        operations += 1
+    results.put((operations, created, lost))
+
+
+if __name__ == "__main__":
+    User.load_from_file()
+    for count in (1, 2, 4, 8):
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker,
+                                             args=(i, 2, results))
+                     for i in range(count)]
+        for process in processes:
+            process.start()
+        done = [results.get() for process in processes]
+        for process in processes:
+            process.join()
+        expected = {user_id for _, created, _ in done for user_id in created}
+        found = {user.id for user in User.search()
+                 if user.email.startswith("worker")}
+        print("{} workers: {} operations/s, lost: {}, store matches: {}"
+              .format(count, sum(d[0] for d in done) // 2,
+                      sum(d[2] for d in done), found == expected))
+        User.remove_many(found)
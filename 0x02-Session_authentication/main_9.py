@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+""" Main 9
+    Runs the same model operations with each MODELS_PERSISTENCE backend
+    and checks they all return the same, then times them
+    Run as: ./main_9.py [number of users for the benchmark]
+"""
+from datetime import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKENDS = ("snapshot", "journal", "shared", "sqlite")
+
+
+def parity():
+    """ Model operations, returning what they read """
+    from models.user import User
+    from models.user_session import UserSession
+
+    def ids(objs):
+        """ Ids of objects """
+        return [obj.id for obj in objs]
+
+    User.load_from_file()
+    UserSession.load_from_file()
+    for i in range(30):
+        user = User(id="user-{:02d}".format(i),
+                    email="user{}@hbtn.io".format(i % 10),
+                    first_name=None if i % 3 else "Bob",
+                    created_at="2024-01-01T00:00:{:02d}".format(i))
+        user.password = "pwd{}".format(i)
+        user.save()
+        UserSession(id="session-{:02d}".format(i), user_id=user.id,
+                    session_id="cookie-{:02d}".format(i)).save()
+    results = [("count", User.count()),
+               ("all", ids(User.all())),
+               ("search email", ids(User.search({"email": "user3@hbtn.io"}))),
+               ("search None", ids(User.search({"first_name": None}))),
+               ("search both", ids(User.search({"email": "user3@hbtn.io",
+                                                "first_name": "Bob"}))),
+               ("search missing", ids(User.search({"email": "nobody"}))),
+               ("search date", ids(User.search(
+                   {"created_at": datetime(2024, 1, 1, 0, 0, 5)}))),
+               ("get missing", User.get("nobody")),
+               ("find", User.find("email", "user4@hbtn.io").id),
+               ("find missing", User.find("email", "nobody")),
+               ("password", User.find("email", "user4@hbtn.io")
+                .is_valid_password("pwd4")),
+               ("iterate", ids(User.iterate(after="user-25"))),
+               ("iterate email", ids(User.iterate(
+                   attributes={"email": "user1@hbtn.io"})))]
+    user = User.get("user-05")
+    user.last_name = "Dylan"
+    user.save()
+    user = User.get("user-05").to_json()
+    del user["updated_at"]
+    results.append(("get", user))
+    User.get("user-00").remove()
+    User.remove_many(["user-01", "user-02", "nobody"])
+    session = UserSession.find("session_id", "cookie-07")
+    session.updated_at = datetime(2030, 1, 1)
+    UserSession.save_many([session], touch=False)
+    results += [("count removed", User.count()),
+                ("sessions", ids(UserSession.search({"user_id": "user-07"}))),
+                ("no touch", str(UserSession.get("session-07").updated_at))]
+    User.load_from_file()
+    UserSession.load_from_file()
+    results += [("reloaded", ids(User.all())),
+                ("reloaded sessions", UserSession.count())]
+    return results
+
+
+def benchmark(count):
+    """ Microseconds per operation with count users stored """
+    from models.user import User
+    User.load_from_file()
+    User.save_many([User(email="user{}@hbtn.io".format(i))
+                    for i in range(count)])
+    users = User.search()[:100]
+    timings = {}
+    operations = (("save", lambda user: user.save()),
+                  ("get", lambda user: User.get(user.id)),
+                  ("search email",
+                   lambda user: User.search({"email": user.email})),
+                  ("count", lambda user: User.count()))
+    for name, operation in operations:
+        start = time.perf_counter()
+        for user in users:
+            operation(user)
+        timings[name] = (time.perf_counter() - start) * 1e6 / len(users)
+    return timings
+
+
+def run(backend, *args):
+    """ Runs this script with a backend, in an empty directory """
+    env = dict(os.environ, MODELS_PERSISTENCE=backend)
+    with tempfile.TemporaryDirectory() as directory:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__)] + list(args),
+            env=env, cwd=directory, check=True, stdout=subprocess.PIPE)
+    return json.loads(output.stdout)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["parity"]:
+        print(json.dumps(parity()))
+    elif sys.argv[1:2] == ["benchmark"]:
+        print(json.dumps(benchmark(int(sys.argv[2]))))
+    else:
+        expected = run(BACKENDS[0], "parity")
+        for backend in BACKENDS[1:]:
+            results = run(backend, "parity")
+            differences = [name for (name, value), (_, other)
+                           in zip(expected, results) if value != other]
+            print("{}: same as {}: {}".format(
+                backend, BACKENDS[0], differences or True))
+
+        count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+        print("{} users, us per operation".format(count))
+        for backend in BACKENDS:
+            timings = run(backend, "benchmark", str(count))
+            print("{:>8}: {}".format(backend, ", ".join(
+                "{} {:.0f}".format(name, timing)
+                for name, timing in timings.items())))
@@ -1,40 +1,133 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_right, insort
+from calendar import timegm
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from models import binary_store
+from typing import TypeVar, List, Iterable, Iterator, Tuple
+from os import getenv, path
+import fcntl
 import json
+import os
+import threading
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+ORDERS = {}
+ITERATION_CHUNK = 256
+PERSISTENCE = getenv("MODELS_PERSISTENCE", "snapshot")
+JOURNAL_SIZE = int(getenv("MODELS_JOURNAL_SIZE", 4 * 1024 * 1024))
+JOURNAL_LOCK = threading.Lock()
+COMPACTIONS = {}
+GROUP_COMMIT = float(getenv("MODELS_GROUP_COMMIT_MS", 0)) / 1000
+GROUP_COMMIT_CONDITION = threading.Condition()
+PENDING_COMMITS = {}
+SNAPSHOT_LOCKS = {}
+STORE_LOCKS = {}
+FILE_LOCKS = {}
+FILE_LOCK_DEPTHS = {}
+SHARED_STATES = {}
+LAZY_LOAD = getenv("MODELS_LAZY_LOAD", "0") == "1"
+MAPPED = {}
+JSON_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+if PERSISTENCE == "sqlite":
+    from models import sql_store
+# flock belongs to the open file: a forked child opens its own
+os.register_at_fork(after_in_child=lambda: (FILE_LOCKS.clear(),
+                                            FILE_LOCK_DEPTHS.clear()))
 
 
 class Base():
     """ Base class
+        The store of a class is changed under its lock only, readers
+        go without it: they see each change whole, and copy what they
+        iterate
     """
 
+    __slots__ = ("id", "_created_at", "_updated_at", "_version", "_json",
+                 "_json_text")
+
+    INDEXED_ATTRIBUTES = ()
+    STORAGE_FORMAT = getenv("MODELS_STORAGE_FORMAT", "json")
+    FIELDS = ("id", "created_at", "updated_at")
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            with self.__class__._lock():
+                if DATA.get(s_class) is None:
+                    DATA[s_class] = {}
+                    self.__class__._reset_indexes()
 
+        object.__setattr__(self, '_version', 0)
+        object.__setattr__(self, '_json', None)
+        object.__setattr__(self, '_json_text', None)
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
+    @property
+    def created_at(self) -> datetime:
+        """ Creation date
+        """
+        return self._datetime('_created_at')
+
+    @created_at.setter
+    def created_at(self, value):
+        """ Setter of the creation date, a datetime or a string
+            in TIMESTAMP_FORMAT
+        """
+        self._created_at = _epoch(value) if type(value) is datetime \
+            else value
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Last update date
+        """
+        return self._datetime('_updated_at')
+
+    @updated_at.setter
+    def updated_at(self, value):
+        """ Setter of the last update date, a datetime or a string
+            in TIMESTAMP_FORMAT
+        """
+        self._updated_at = _epoch(value) if type(value) is datetime \
+            else value
+
+    def _datetime(self, slot: str) -> datetime:
+        """ Return a date attribute
+            Dates are kept as integer UTC epochs, or as loaded strings
+            until first accessed
+        """
+        value = getattr(self, slot)
+        if type(value) is str:
+            value = _epoch(datetime.strptime(value, TIMESTAMP_FORMAT))
+            setattr(self, slot, value)
+        return datetime.utcfromtimestamp(value)
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, outdating the cached serializations
+            Caches are tagged with the version they were built from, so
+            one built while an attribute is set is never used
+        """
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_version', self._version + 1)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -46,65 +139,534 @@ class Base():
 
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
+            The dictionary is built once and cached until an attribute
+            is set, callers get their own copy
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
-        return result
+        version = self._version
+        record = self._json
+        if record is not None and record[0] == version:
+            record = record[1]
+        else:
+            record = {}
+            for key in self.FIELDS:
+                if key == 'created_at' or key == 'updated_at':
+                    value = getattr(self, '_' + key)
+                    if type(value) is int:
+                        value = time.strftime(TIMESTAMP_FORMAT,
+                                              time.gmtime(value))
+                    record[key] = value
+                else:
+                    record[key] = getattr(self, key)
+            object.__setattr__(self, '_json', (version, record))
+        if for_serialization:
+            return dict(record)
+        return {k: v for k, v in record.items() if k[0] != '_'}
+
+    def to_json_string(self) -> str:
+        """ Convert the object to JSON text, as jsonify renders
+            to_json(), cached until an attribute is set
+        """
+        version = self._version
+        text = self._json_text
+        if text is not None and text[0] == version:
+            return text[1]
+        text = JSON_ENCODER.encode(self.to_json())
+        object.__setattr__(self, '_json_text', (version, text))
+        return text
 
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
+            With MODELS_LAZY_LOAD=1, records are kept as loaded from
+            the file and only turned into objects when first returned,
+            indexes being built on the first search
+            A journal left by a compaction that did not finish is
+            written into the snapshot, before another one may replace it
+        """
+        s_class = cls.__name__
+        if PERSISTENCE == "sqlite":
+            cls._import_files()
+            return
+        if PERSISTENCE == "shared":
+            SHARED_STATES.pop(s_class, None)
+            cls._sync()
+            return
+        compaction = COMPACTIONS.get(s_class)
+        if compaction is not None:
+            compaction.join()
+        compacting_path = ".db_{}.json.compacting".format(s_class)
+        with SNAPSHOT_LOCKS.setdefault(s_class, threading.Lock()):
+            with cls._lock():
+                cls._load_snapshot()
+                for journal_path in (compacting_path, cls._journal_path()):
+                    if path.exists(journal_path):
+                        cls._replay_journal(journal_path)
+                if path.exists(compacting_path):
+                    cls._write_file(cls.STORAGE_FORMAT,
+                                    list(DATA[s_class].items()))
+                    os.remove(compacting_path)
+
+    @classmethod
+    def _import_files(cls):
+        """ Create the table of the class, filled with the objects of
+            its files when empty, with MODELS_PERSISTENCE=sqlite
+        """
+        s_class = cls.__name__
+        sql_table = cls._table()
+        if sql_store.count(sql_table) > 0:
+            return
+        with cls._lock():
+            cls._load_snapshot()
+            for journal_path in (".db_{}.json.compacting".format(s_class),
+                                 cls._journal_path()):
+                if path.exists(journal_path):
+                    cls._replay_journal(journal_path, truncate=False)
+            records = [cls._record(obj_id, obj)
+                       for obj_id, obj in DATA[s_class].items()]
+            DATA[s_class] = {}
+            cls._reset_indexes()
+            MAPPED.pop(s_class, None)
+        sql_store.upsert(sql_table, records)
+
+    @classmethod
+    def _table(cls):
+        """ SQL table of the class, with MODELS_PERSISTENCE=sqlite
+        """
+        return sql_store.table(cls.__name__, cls.FIELDS,
+                               cls.INDEXED_ATTRIBUTES)
+
+    @classmethod
+    def _columns(cls, attributes: dict) -> Tuple[dict, dict]:
+        """ Split searched attributes into those compared by the
+            database, stored as they are in a column, and the others
+        """
+        where, rest = {}, {}
+        for k, v in attributes.items():
+            if k in cls.FIELDS and k not in Base.FIELDS[1:] and \
+                    (v is None or type(v) is str):
+                where[k] = v
+            else:
+                rest[k] = v
+        return where, rest
+
+    @classmethod
+    def _load_snapshot(cls):
+        """ Replace the objects of the class with those of its file
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        cls._reset_indexes()
+        if path.exists(cls._file_path()):
+            records = cls._read_file(cls.STORAGE_FORMAT, lazy=True)
+            if LAZY_LOAD:
+                DATA[s_class] = records
+                INDEXES[s_class] = None
+            else:
+                for obj_id, record in records.items():
+                    obj = cls(**cls._record(obj_id, record))
+                    DATA[s_class][obj_id] = obj
+                    cls._index(obj_id, obj)
+
+    @classmethod
+    def _sync(cls):
+        """ Catch up with the changes other processes made, with
+            MODELS_PERSISTENCE=shared
+            Every process appends its changes to the journal under an
+            exclusive lock of the lock file; the others replay what
+            they have not seen yet before each read. A stat of the
+            journal is all it costs when nothing changed.
+        """
+        if PERSISTENCE != "shared":
+            return
+        state = SHARED_STATES.get(cls.__name__)
+        if state is not None:
+            try:
+                if _stat_key(os.stat(cls._journal_path())) == state[0]:
+                    return
+            except FileNotFoundError:
+                if state[0] is None:
+                    return
+        with cls._file_lock(fcntl.LOCK_SH):
+            pass
+
+    @classmethod
+    @contextmanager
+    def _file_lock(cls, operation: int):
+        """ Hold the store lock and, with MODELS_PERSISTENCE=shared,
+            the lock file of the class, caught up with the journal
+            operation is fcntl.LOCK_SH to read, fcntl.LOCK_EX to write;
+            a thread already holding it keeps its lock
+        """
+        with cls._lock():
+            s_class = cls.__name__
+            if PERSISTENCE != "shared" or FILE_LOCK_DEPTHS.get(s_class):
+                yield
+                return
+            lock_file = FILE_LOCKS.get(s_class)
+            if lock_file is None:
+                lock_file = open(".db_{}.lock".format(s_class), 'a')
+                FILE_LOCKS[s_class] = lock_file
+            fcntl.flock(lock_file, operation)
+            FILE_LOCK_DEPTHS[s_class] = 1
+            try:
+                cls._catch_up(operation == fcntl.LOCK_EX)
+                yield
+            finally:
+                FILE_LOCK_DEPTHS[s_class] = 0
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @classmethod
+    def _catch_up(cls, exclusive: bool):
+        """ Replay the journal from where this process stopped, or
+            reload everything if it was compacted since
+            The state of a class is the stat key of its journal, the
+            generation read from the journal header and the offset
+            replayed up to. Each compaction starts a new generation,
+            as the new journal may reuse the inode of an old one.
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_path()
+        generation = None
+        try:
+            with open(journal_path, 'rb') as f:
+                header = f.readline()
+        except FileNotFoundError:
+            header = None
+        if header is not None and header.endswith(b"\n"):
+            try:
+                generation = json.loads(header).get("generation")
+            except ValueError:
+                pass
+        state = SHARED_STATES.get(s_class)
+        if state is None or state[1] != generation:
+            cls._load_snapshot()
+            state = (None, generation, 0)
+        if header is None:
+            SHARED_STATES[s_class] = (None, None, 0)
             return
+        offset = cls._replay_journal(journal_path, state[2],
+                                     truncate=exclusive)
+        SHARED_STATES[s_class] = (_stat_key(os.stat(journal_path)),
+                                  generation, offset)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _journal_path(cls) -> str:
+        """ Path of the journal of the class
+        """
+        return ".db_{}.journal".format(cls.__name__)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+            With MODELS_GROUP_COMMIT_MS set, saves arriving within that
+            window are written together and return once written
+        """
+        if PERSISTENCE == "sqlite":
+            return
+        if GROUP_COMMIT > 0:
+            cls._group_commit()
+        else:
+            cls._write_snapshot()
+
+    @classmethod
+    def convert_file(cls, source_format: str, target_format: str):
+        """ Rewrite the file of the class from one storage format
+            ("json" or "binary") to the other
+        """
+        records = cls._read_file(source_format)
+        cls._write_file(target_format, records.items())
+
+    @classmethod
+    def _file_path(cls, storage_format: str = None) -> str:
+        """ Path of the file of the class in a storage format
+        """
+        storage_format = storage_format or cls.STORAGE_FORMAT
+        extension = "bin" if storage_format == "binary" else "json"
+        return ".db_{}.{}".format(cls.__name__, extension)
+
+    @classmethod
+    def _read_file(cls, storage_format: str, lazy: bool = False) -> dict:
+        """ Read the records of the file of the class
+            A lazy read of a binary file maps it and returns record
+            numbers, decoded later through _record
+        """
+        file_path = cls._file_path(storage_format)
+        if storage_format != "binary":
+            with open(file_path, 'r') as f:
+                return json.load(f)
+        store = binary_store.MappedStore(file_path)
+        if lazy:
+            MAPPED[cls.__name__] = store
+            return dict(zip(store.ids, range(len(store.ids))))
+        return {obj_id: store.record(i) for i, obj_id in enumerate(store.ids)}
+
+    @classmethod
+    def _write_file(cls, storage_format: str, items: Iterable[Tuple]):
+        """ Write (id, object or record) pairs to a temporary file then
+            rename it over the file of the class, so the file is never
+            seen truncated
+        """
+        file_path = cls._file_path(storage_format)
+        tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+        if storage_format == "binary":
+            store = MAPPED.get(cls.__name__)
+            same_schema = store is not None and \
+                store.fields == list(cls.FIELDS) + [binary_store.EXTRA]
+
+            def records():
+                for obj_id, obj in items:
+                    if type(obj) is int and same_schema:
+                        yield obj_id, store.raw(obj)
+                    else:
+                        yield obj_id, cls._record(obj_id, obj)
+
+            with open(tmp_path, 'wb') as f:
+                binary_store.dump(f, cls.FIELDS, records())
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            objs_json = {}
+            for obj_id, obj in items:
+                objs_json[obj_id] = cls._record(obj_id, obj)
+
+            with open(tmp_path, 'w') as f:
+                json.dump(objs_json, f)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def _write_snapshot(cls):
+        """ Write all objects to the file of the class
+            Objects are serialized out of the store lock, from a copy of
+            the store taken under it
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with SNAPSHOT_LOCKS.setdefault(s_class, threading.Lock()):
+            with cls._lock():
+                items = list(DATA[s_class].items())
+            cls._write_file(cls.STORAGE_FORMAT, items)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def _record(cls, obj_id: str, obj) -> dict:
+        """ JSON dictionary of a stored object, lazily loaded record
+            or binary record number
+        """
+        if type(obj) is dict:
+            return obj
+        if type(obj) is int:
+            return MAPPED[cls.__name__].record(obj)
+        return obj.to_json(True)
+
+    @classmethod
+    def _group_commit(cls):
+        """ Join the pending commit of the class, or open one and write
+            it once the window is over
+            The snapshot is taken after the commit is closed, so it
+            holds the changes of every caller that joined it.
+        """
+        s_class = cls.__name__
+        with GROUP_COMMIT_CONDITION:
+            commit = PENDING_COMMITS.get(s_class)
+            if commit is not None:
+                while not commit["done"]:
+                    GROUP_COMMIT_CONDITION.wait()
+                if commit["error"] is not None:
+                    raise commit["error"]
+                return
+            commit = {"done": False, "error": None}
+            PENDING_COMMITS[s_class] = commit
+
+        time.sleep(GROUP_COMMIT)
+        with GROUP_COMMIT_CONDITION:
+            del PENDING_COMMITS[s_class]
+        try:
+            cls._write_snapshot()
+        except Exception as e:
+            commit["error"] = e
+            raise
+        finally:
+            with GROUP_COMMIT_CONDITION:
+                commit["done"] = True
+                GROUP_COMMIT_CONDITION.notify_all()
+
+    @classmethod
+    def _append_journal(cls, entries: List[Tuple[str, dict]]):
+        """ Append mutations to the journal of the class, in one write
+            Each entry is an id with the saved object, or with None
+            for a removal.
+            Once the journal reaches JOURNAL_SIZE bytes, it is
+            compacted into the snapshot in the background.
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_path()
+        lines = "".join(json.dumps({"id": obj_id, "obj": obj_json}) + "\n"
+                        for obj_id, obj_json in entries)
+        with JOURNAL_LOCK:
+            with open(journal_path, 'a') as f:
+                if PERSISTENCE == "shared":
+                    generation = SHARED_STATES[s_class][1]
+                    if f.tell() == 0:
+                        generation = str(uuid.uuid4())
+                        lines = _journal_header(generation) + lines
+                f.write(lines)
+                f.flush()
+                size = f.tell()
+                key = _stat_key(os.fstat(f.fileno()))
+            if PERSISTENCE == "shared":
+                SHARED_STATES[s_class] = (key, generation, size)
+                if size >= JOURNAL_SIZE:
+                    cls._compact_shared()
+                return
+            compaction = COMPACTIONS.get(s_class)
+            compacting_path = ".db_{}.json.compacting".format(s_class)
+            if size < JOURNAL_SIZE or \
+                    (compaction is not None and compaction.is_alive()) or \
+                    path.exists(compacting_path):
+                return
+            os.replace(journal_path, compacting_path)
+            compaction = threading.Thread(target=cls._compact,
+                                          args=(compacting_path,),
+                                          daemon=True)
+            COMPACTIONS[s_class] = compaction
+            compaction.start()
+
+    @classmethod
+    def _compact(cls, compacting_path: str):
+        """ Write a snapshot of the current objects, then drop the
+            journal it supersedes
+            Mutations made meanwhile are in the new journal: saves
+            and removals replay to the same state over any snapshot
+            taken after the journal was rotated
+        """
+        cls._write_snapshot()
+        os.remove(compacting_path)
+
+    @classmethod
+    def _compact_shared(cls):
+        """ Write a snapshot of the current objects, then start a new
+            journal, the lock file being held exclusively
+            Other processes notice the new generation and reload.
+        """
+        journal_path = cls._journal_path()
+        cls._write_file(cls.STORAGE_FORMAT,
+                        list(DATA[cls.__name__].items()))
+        generation = str(uuid.uuid4())
+        header = _journal_header(generation)
+        tmp_path = "{}.{}.tmp".format(journal_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(header)
+        os.replace(tmp_path, journal_path)
+        SHARED_STATES[cls.__name__] = (_stat_key(os.stat(journal_path)),
+                                       generation, len(header))
+
+    @classmethod
+    def _replay_journal(cls, journal_path: str, start: int = 0,
+                        truncate: bool = True) -> int:
+        """ Apply the mutations of a journal to the loaded objects,
+            from the offset start
+            A line left incomplete by a crash is cut off the journal,
+            unless truncate is False
+            Return: offset of the end of the last complete line
+        """
+        s_class = cls.__name__
+        valid_size = start
+        with open(journal_path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                valid_size += len(line)
+                if "generation" in entry:
+                    continue
+                obj_id = entry["id"]
+                if entry["obj"] is None:
+                    if DATA[s_class].pop(obj_id, None) is not None:
+                        cls._unindex(obj_id)
+                        cls._unorder(obj_id)
+                else:
+                    obj = entry["obj"]
+                    obj = obj if LAZY_LOAD else cls(**obj)
+                    if obj_id not in DATA[s_class]:
+                        cls._order(obj_id)
+                    DATA[s_class][obj_id] = obj
+                    cls._index(obj_id, obj)
+        if truncate and valid_size < path.getsize(journal_path):
+            with open(journal_path, 'r+b') as f:
+                f.truncate(valid_size)
+        return valid_size
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.__class__.save_many([self])
+
+    @classmethod
+    def save_many(cls, objs: Iterable[TypeVar('Base')], touch: bool = True):
+        """ Save objects, persisted with one write
+            With touch False, their updated_at is kept as set
+        """
+        s_class = cls.__name__
+        if PERSISTENCE == "sqlite":
+            records = []
+            for obj in objs:
+                if touch:
+                    obj.updated_at = datetime.utcnow()
+                records.append(obj.to_json(True))
+            sql_store.upsert(cls._table(), records)
+            return
+        saved = []
+        with cls._file_lock(fcntl.LOCK_EX):
+            for obj in objs:
+                if touch:
+                    obj.updated_at = datetime.utcnow()
+                if obj.id not in DATA[s_class]:
+                    cls._order(obj.id)
+                DATA[s_class][obj.id] = obj
+                cls._index(obj.id, obj)
+                saved.append(obj)
+            if saved and PERSISTENCE in ("journal", "shared"):
+                cls._append_journal([(obj.id, obj.to_json(True))
+                                     for obj in saved])
+        if saved and PERSISTENCE not in ("journal", "shared"):
+            cls.save_to_file()
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        self.__class__.remove_many([self.id])
+
+    @classmethod
+    def remove_many(cls, obj_ids: Iterable[str]):
+        """ Remove the objects of some ids, persisted with one write
+        """
+        s_class = cls.__name__
+        if PERSISTENCE == "sqlite":
+            sql_store.delete(cls._table(), list(obj_ids))
+            return
+        removed = []
+        with cls._file_lock(fcntl.LOCK_EX):
+            for obj_id in obj_ids:
+                if DATA[s_class].pop(obj_id, None) is not None:
+                    cls._unindex(obj_id)
+                    cls._unorder(obj_id)
+                    removed.append((obj_id, None))
+            if removed and PERSISTENCE in ("journal", "shared"):
+                cls._append_journal(removed)
+        if removed and PERSISTENCE not in ("journal", "shared"):
+            cls.save_to_file()
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
+        if PERSISTENCE == "sqlite":
+            return sql_store.count(cls._table())
+        cls._sync()
         s_class = cls.__name__
         return len(DATA[s_class].keys())
 
@@ -118,14 +680,69 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
+        if PERSISTENCE == "sqlite":
+            objs = cls.search({"id": id}) if type(id) is str else []
+            return objs[0] if objs else None
+        cls._sync()
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        obj = DATA[s_class].get(id)
+        if obj is None:
+            return None
+        return cls._materialize(id, obj)
+
+    @classmethod
+    def find(cls, attribute: str, value) -> TypeVar('Base'):
+        """ Return one object with a matching attribute, or None
+            An indexed attribute is resolved with its index, without
+            building a result list
+        """
+        if PERSISTENCE == "sqlite":
+            where, rest = cls._columns({attribute: value})
+            if where:
+                records = sql_store.select_records(cls._table(), where, 1)
+                return cls(**records[0]) if records else None
+            objs = cls.search(rest)
+            return objs[0] if objs else None
+        cls._sync()
+        s_class = cls.__name__
+        if attribute not in cls.INDEXED_ATTRIBUTES:
+            objs = cls.search({attribute: value})
+            return objs[0] if objs else None
+        if INDEXES[s_class] is None:
+            cls._build_indexes()
+        for obj_id in list(INDEXES[s_class][attribute].get(value, ())):
+            obj = DATA[s_class].get(obj_id)
+            if obj is not None:
+                return cls._materialize(obj_id, obj)
+        return None
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+            An equality on an indexed attribute is resolved with its
+            index, the other attributes are then checked one by one
+            With MODELS_PERSISTENCE=sqlite, the database compares the
+            stored attributes, using the indexes of the table
         """
+        if PERSISTENCE == "sqlite":
+            where, rest = cls._columns(attributes)
+            objs = [cls(**record) for record in
+                    sql_store.select_records(cls._table(), where)]
+            return [obj for obj in objs
+                    if all(getattr(obj, k) == v for k, v in rest.items())]
+        cls._sync()
         s_class = cls.__name__
+        objs = DATA[s_class]
+        obj_ids = None
+        if INDEXES[s_class] is None:
+            cls._build_indexes()
+        for k in cls.INDEXED_ATTRIBUTES:
+            if k in attributes:
+                obj_ids = list(INDEXES[s_class][k].get(attributes[k], {}))
+                break
+        if obj_ids is None:
+            obj_ids = list(objs.keys())
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +750,181 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        candidates = []
+        for obj_id in obj_ids:
+            obj = objs.get(obj_id)
+            if obj is not None:
+                candidates.append(cls._materialize(obj_id, obj))
+        return list(filter(_search, candidates))
+
+    @classmethod
+    def iterate(cls, after: str = None,
+                attributes: dict = {}) -> Iterator[TypeVar('Base')]:
+        """ Iterate objects with matching attributes in id order
+            Iteration starts after the id after, so a page of n objects
+            costs O(n + log N), ids being read ITERATION_CHUNK at a
+            time; an equality on an indexed attribute walks
+            its index entries instead, sorted first
+        """
+        if PERSISTENCE == "sqlite":
+            where, rest = cls._columns(attributes)
+            for record in sql_store.iterate_records(
+                    cls._table(), after, where, ITERATION_CHUNK):
+                obj = cls(**record)
+                if all(getattr(obj, k) == v for k, v in rest.items()):
+                    yield obj
+            return
+        cls._sync()
+        s_class = cls.__name__
+        objs = DATA[s_class]
+        obj_ids = None
+        for k in cls.INDEXED_ATTRIBUTES:
+            if k in attributes:
+                if INDEXES[s_class] is None:
+                    cls._build_indexes()
+                entries = INDEXES[s_class][k].get(attributes[k], {})
+                obj_ids = sorted(list(entries))
+                break
+        if obj_ids is None:
+            if ORDERS.get(s_class) is None:
+                with cls._lock():
+                    if ORDERS.get(s_class) is None:
+                        ORDERS[s_class] = sorted(objs)
+            obj_ids = ORDERS[s_class]
+
+        while True:
+            i = 0 if after is None else bisect_right(obj_ids, after)
+            chunk = obj_ids[i:i + ITERATION_CHUNK]
+            if not chunk:
+                return
+            for after in chunk:
+                obj = objs.get(after)
+                if obj is None:
+                    continue
+                if not isinstance(obj, Base):
+                    obj = cls._materialize(after, obj)
+                if attributes and not all(getattr(obj, k) == v
+                                          for k, v in attributes.items()):
+                    continue
+                yield obj
+
+    @classmethod
+    def _materialize(cls, obj_id: str, obj) -> TypeVar('Base'):
+        """ Return the object of a stored record, building it first
+            if it was lazily loaded
+        """
+        if isinstance(obj, Base):
+            return obj
+        with cls._lock():
+            current = DATA[cls.__name__].get(obj_id)
+            if isinstance(current, Base):
+                return current
+            obj = cls(**cls._record(obj_id, obj))
+            if current is not None:
+                DATA[cls.__name__][obj_id] = obj
+        return obj
+
+    @classmethod
+    def _lock(cls) -> threading.RLock:
+        """ Lock of the store of the class
+        """
+        lock = STORE_LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = STORE_LOCKS.setdefault(cls.__name__, threading.RLock())
+        return lock
+
+    @classmethod
+    def _reset_indexes(cls):
+        """ Empty the indexes of the class
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {k: {} for k in cls.INDEXED_ATTRIBUTES}
+        INDEXED_VALUES[s_class] = {}
+        ORDERS[s_class] = None
+
+    @classmethod
+    def _build_indexes(cls):
+        """ Index every stored object of the class
+        """
+        with cls._lock():
+            if INDEXES[cls.__name__] is not None:
+                return
+            INDEXES[cls.__name__] = {k: {} for k in cls.INDEXED_ATTRIBUTES}
+            INDEXED_VALUES[cls.__name__] = {}
+            for obj_id, obj in list(DATA[cls.__name__].items()):
+                cls._index(obj_id, obj)
+
+    @classmethod
+    def _index(cls, obj_id: str, obj):
+        """ Add an object, or a lazily loaded record, to the indexes,
+            or move it to the entries of its current values
+        """
+        s_class = cls.__name__
+        if not cls.INDEXED_ATTRIBUTES or INDEXES[s_class] is None:
+            return
+        if isinstance(obj, Base):
+            values = tuple(getattr(obj, k) for k in cls.INDEXED_ATTRIBUTES)
+        else:
+            record = cls._record(obj_id, obj)
+            values = tuple(record.get(k) for k in cls.INDEXED_ATTRIBUTES)
+        old_values = INDEXED_VALUES[s_class].get(obj_id)
+        if old_values == values:
+            return
+        if old_values is not None:
+            cls._unindex(obj_id)
+        for k, v in zip(cls.INDEXED_ATTRIBUTES, values):
+            INDEXES[s_class][k].setdefault(v, {})[obj_id] = None
+        INDEXED_VALUES[s_class][obj_id] = values
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """ Remove an object from the indexes
+        """
+        s_class = cls.__name__
+        if INDEXES[s_class] is None:
+            return
+        old_values = INDEXED_VALUES[s_class].pop(obj_id, None)
+        if old_values is None:
+            return
+        for k, v in zip(cls.INDEXED_ATTRIBUTES, old_values):
+            entries = INDEXES[s_class][k][v]
+            del entries[obj_id]
+            if not entries:
+                del INDEXES[s_class][k][v]
+
+    @classmethod
+    def _order(cls, obj_id: str):
+        """ Add a new id to the id order of the class, once built
+        """
+        obj_ids = ORDERS.get(cls.__name__)
+        if obj_ids is not None:
+            insort(obj_ids, obj_id)
+
+    @classmethod
+    def _unorder(cls, obj_id: str):
+        """ Remove an id from the id order of the class, once built
+        """
+        obj_ids = ORDERS.get(cls.__name__)
+        if obj_ids is not None:
+            i = bisect_right(obj_ids, obj_id) - 1
+            if i >= 0 and obj_ids[i] == obj_id:
+                del obj_ids[i]
+
+
+def _epoch(value: datetime) -> int:
+    """ Integer epoch of a naive UTC datetime
+    """
+    return timegm(value.timetuple())
+
+
+def _stat_key(stat: os.stat_result) -> Tuple[int, int, int]:
+    """ What tells a journal changed: inode, size and write time
+    """
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _journal_header(generation: str) -> str:
+    """ First line of a shared journal
+    """
+    return json.dumps({"generation": generation}) + "\n"
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+""" SQL store module
+    SQLite tables for the models, through SQLAlchemy: one table per
+    class, a text column per field and an index per indexed attribute.
+    Rows are read and written as the JSON dictionaries of the objects,
+    through statements built once for each table and shape of query.
+"""
+from os import getenv
+from sqlalchemy import (Column, Index, MetaData, String, Table, bindparam,
+                        create_engine, event, func, inspect, literal_column,
+                        select)
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from typing import Callable, Iterable, Iterator, List, Tuple
+import threading
+
+
+DATABASE = getenv("MODELS_DATABASE", ".db_models.sqlite")
+CHUNK = 500
+METADATA = MetaData()
+ROWID = literal_column("rowid")
+ENGINE_LOCK = threading.Lock()
+TABLE_LOCK = threading.Lock()
+ENGINES = {}
+STATEMENTS = {}
+
+
+def engine() -> Engine:
+    """ Engine of the database, created on first use
+        The database is in WAL mode: readers do not wait for the
+        writer, and several processes may share it
+    """
+    db_engine = ENGINES.get(DATABASE)
+    if db_engine is not None:
+        return db_engine
+    with ENGINE_LOCK:
+        if DATABASE not in ENGINES:
+            db_engine = create_engine(
+                "sqlite:///{}".format(DATABASE),
+                connect_args={"check_same_thread": False})
+            event.listen(db_engine, "connect", _set_pragmas)
+            ENGINES[DATABASE] = db_engine
+        return ENGINES[DATABASE]
+
+
+def _set_pragmas(connection, connection_record) -> None:
+    """ Pragmas of each new SQLite connection
+    """
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def table(name: str, fields: Iterable[str],
+          indexed: Iterable[str] = ()) -> Table:
+    """ Table of a class, created in the database if missing
+        Another process may create it meanwhile
+        Args:
+            - name: class name, used as table name
+            - fields: schema of the records, "id" being the primary key
+            - indexed: fields to index
+    """
+    sql_table = METADATA.tables.get(name)
+    if sql_table is not None:
+        return sql_table
+    with TABLE_LOCK:
+        sql_table = METADATA.tables.get(name)
+        if sql_table is None:
+            columns = [Column(field, String, primary_key=(field == "id"))
+                       for field in fields]
+            indexes = [Index("ix_{}_{}".format(name, field), field)
+                       for field in indexed]
+            try:
+                Table(name, METADATA, *columns, *indexes).create(
+                    engine(), checkfirst=True)
+            except OperationalError:
+                if not inspect(engine()).has_table(name):
+                    raise
+            sql_table = METADATA.tables[name]
+    return sql_table
+
+
+def select_records(sql_table: Table, where: dict = {},
+                   limit: int = None) -> List[dict]:
+    """ Records with fields equal to the values of where, in the order
+        they were first saved
+    """
+    shape, params = _where(where)
+
+    def build():
+        query = select(sql_table).where(*_conditions(sql_table, shape)) \
+            .order_by(ROWID)
+        return query if limit is None else query.limit(limit)
+
+    query = _statement(("select", sql_table.name, shape, limit), build)
+    with engine().connect() as connection:
+        return [dict(row._mapping)
+                for row in connection.execute(query, params)]
+
+
+def iterate_records(sql_table: Table, after: str = None, where: dict = {},
+                    chunk: int = CHUNK) -> Iterator[dict]:
+    """ Records with fields equal to the values of where, in id order,
+        starting after the id after
+        Rows are read chunk at a time from the primary key index.
+    """
+    shape, params = _where(where)
+    while True:
+        def build():
+            query = select(sql_table) \
+                .where(*_conditions(sql_table, shape))
+            if after is not None:
+                query = query.where(sql_table.c.id > bindparam("after"))
+            return query.order_by(sql_table.c.id).limit(chunk)
+
+        query = _statement(("iterate", sql_table.name, shape,
+                            after is None, chunk), build)
+        with engine().connect() as connection:
+            records = [dict(row._mapping) for row in
+                       connection.execute(query, dict(params, after=after))]
+        for record in records:
+            yield record
+        if len(records) < chunk:
+            return
+        after = records[-1]["id"]
+
+
+def count(sql_table: Table) -> int:
+    """ Number of records of a table
+    """
+    query = _statement(("count", sql_table.name),
+                       lambda: select(func.count()).select_from(sql_table))
+    with engine().connect() as connection:
+        return connection.execute(query).scalar()
+
+
+def upsert(sql_table: Table, records: List[dict]) -> None:
+    """ Insert records, or update those of ids already stored, in one
+        transaction
+        An updated row keeps its place in the table.
+    """
+    if not records:
+        return
+
+    def build():
+        statement = insert(sql_table)
+        return statement.on_conflict_do_update(
+            index_elements=[sql_table.c.id],
+            set_={column.name: statement.excluded[column.name]
+                  for column in sql_table.columns if column.name != "id"})
+
+    statement = _statement(("upsert", sql_table.name), build)
+    with engine().begin() as connection:
+        for i in range(0, len(records), CHUNK):
+            connection.execute(statement, records[i:i + CHUNK])
+
+
+def delete(sql_table: Table, obj_ids: List[str]) -> None:
+    """ Delete the records of some ids, in one transaction
+    """
+    if not obj_ids:
+        return
+    statement = _statement(("delete", sql_table.name), lambda: sql_table
+                           .delete().where(sql_table.c.id.in_(
+                               bindparam("ids", expanding=True))))
+    with engine().begin() as connection:
+        for i in range(0, len(obj_ids), CHUNK):
+            connection.execute(statement, {"ids": obj_ids[i:i + CHUNK]})
+
+
+def _statement(key: tuple, build: Callable):
+    """ Statement of a key, built on first use
+    """
+    statement = STATEMENTS.get(key)
+    if statement is None:
+        statement = STATEMENTS.setdefault(key, build())
+    return statement
+
+
+def _where(where: dict) -> Tuple[tuple, dict]:
+    """ Shape of equality conditions, as (field, is None) pairs, and
+        the parameters of the fields compared to values
+    """
+    shape = tuple(sorted((field, value is None)
+                         for field, value in where.items()))
+    params = {"w_" + field: value for field, value in where.items()
+              if value is not None}
+    return shape, params
+
+
+def _conditions(sql_table: Table, shape: tuple) -> list:
+    """ Equality conditions on the columns of a table, None values
+        being compared with IS NULL
+    """
+    return [sql_table.c[field].is_(None) if is_none
+            else sql_table.c[field] == bindparam("w_" + field)
+            for field, is_none in shape]
@@ -9,6 +9,11 @@ class User(Base):
     """ User class
     """
 
+    __slots__ = ("email", "_password", "first_name", "last_name")
+
+    INDEXED_ATTRIBUTES = ("email",)
+    FIELDS = Base.FIELDS + ("email", "_password", "first_name", "last_name")
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
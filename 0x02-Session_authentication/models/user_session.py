@@ -3,14 +3,22 @@
 User session module
 """
 from models.base import Base
+import sys
 
 
 class UserSession(Base):
     """ session object representing user session info
     """
+    __slots__ = ("user_id", "session_id")
+
+    INDEXED_ATTRIBUTES = ("session_id", "user_id")
+    FIELDS = Base.FIELDS + ("user_id", "session_id")
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize UserSession instance
         """
         super().__init__(*args, **kwargs)
-        self.user_id = kwargs.get("user_id")
+        user_id = kwargs.get("user_id")
+        self.user_id = sys.intern(user_id) if type(user_id) is str \
+            else user_id
         self.session_id = kwargs.get("session_id", self.id)
@@ -10,6 +10,13 @@ app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
 AUTH = Auth()
 
 
+@app.teardown_appcontext
+def close_db_session(exception) -> None:
+    """ Releases the database session of the request
+    """
+    AUTH.close_db_session()
+
+
 @app.route("/", methods=["GET"])
 def home() -> str:
     """ Home endpoint
@@ -2,16 +2,64 @@
 """Authentication module
 """
 import bcrypt
+import math
+import time
 from db import DB
+from functools import lru_cache
+from os import getenv
 from user import User
 from uuid import uuid4
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 
-def _hash_password(password: str) -> str:
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+HASH_BUDGET_MS = 250
+ROUNDS_FLOOR = 12
+
+
+def _hash_password(password: str, rounds: int = 12) -> str:
     """Hash password
     """
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds))
+
+
+def _hash_rounds(hashed_password: bytes) -> int:
+    """Gets the cost factor of a hashed password
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode()
+    return int(hashed_password.split(b"$")[2])
+
+
+@lru_cache(maxsize=None)
+def _calibrate_rounds(budget_ms: float = HASH_BUDGET_MS) -> int:
+    """Picks the highest cost factor hashing within budget on this host
+        Measured once per process and budget
+        Args:
+            - budget_ms: maximum time in milliseconds a hash may take
+        Return: cost factor, at least MIN_ROUNDS
+    """
+    def measure(rounds: int, repeat: int = 1) -> float:
+        """Best hashing time of a cost factor, in milliseconds
+        """
+        salt = bcrypt.gensalt(rounds)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    elapsed = measure(MIN_ROUNDS, repeat=5)
+    if elapsed >= budget_ms:
+        return MIN_ROUNDS
+    rounds = MIN_ROUNDS + int(math.log2(budget_ms / elapsed))
+    rounds = min(rounds, MAX_ROUNDS)
+    while rounds > MIN_ROUNDS and measure(rounds) > budget_ms:
+        rounds -= 1
+    return rounds
 
 
 class Auth:
@@ -20,6 +68,20 @@ class Auth:
 
     def __init__(self):
         self._db = DB()
+        rounds = getenv("AUTH_BCRYPT_ROUNDS")
+        if rounds:
+            self._rounds = int(rounds)
+        else:
+            budget = getenv("AUTH_HASH_BUDGET_MS") or HASH_BUDGET_MS
+            floor = int(getenv("AUTH_MIN_ROUNDS") or ROUNDS_FLOOR)
+            self._rounds = min(max(_calibrate_rounds(float(budget)), floor),
+                               MAX_ROUNDS)
+
+    def close_db_session(self) -> None:
+        """Releases the database session of the current thread, at the
+            end of each request
+        """
+        self._db.remove_session()
 
     def register_user(self, email: str, password: str) -> User:
         """Register a new user
@@ -27,15 +89,19 @@ class Auth:
                 - email: user's email
                 - password: user's password
             Return: User instance created
+            The unique email index rejects a concurrent registration
+            of the same email
         """
         db = self._db
         try:
             user = db.find_user_by(email=email)
         except NoResultFound:
-            user = db.add_user(email, _hash_password(password))
-            return user
-        else:
-            raise ValueError(f"User {email} already exists")
+            try:
+                return db.add_user(email,
+                                   _hash_password(password, self._rounds))
+            except IntegrityError:
+                pass
+        raise ValueError(f"User {email} already exists")
 
     def valid_login(self, email: str, password: str) -> bool:
         """Validate user's login
@@ -43,13 +109,20 @@ class Auth:
                 - email: user's email
                 - password: user's password
             Return: True if the password is correct, False otherwise
+            A correct password stored with a lower cost factor than
+            the configured one is hashed again
         """
         db = self._db
         try:
             user = db.find_user_by(email=email)
         except NoResultFound:
             return False
-        return bcrypt.checkpw(password.encode(), user.hashed_password)
+        if not bcrypt.checkpw(password.encode(), user.hashed_password):
+            return False
+        if _hash_rounds(user.hashed_password) < self._rounds:
+            db.update_user(user.id, hashed_password=_hash_password(
+                password, self._rounds))
+        return True
 
     def create_session(self, email: str) -> str:
         """Create a new session
@@ -116,7 +189,8 @@ class Auth:
             user = db.find_user_by(reset_token=reset_token)
         except NoResultFound:
             raise ValueError
-        db.update_user(user.id, hashed_password=_hash_password(password))
+        db.update_user(user.id,
+                       hashed_password=_hash_password(password, self._rounds))
         db.update_user(user.id, reset_token=None)
         return None
 
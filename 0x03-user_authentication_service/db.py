@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine
+from os import getenv
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
 from user import Base, User
@@ -12,24 +14,39 @@ from user import Base, User
 
 class DB:
     """DB class
+        Each thread gets its own session from a pool of connections,
+        until remove_session is called at the end of its request
     """
 
     def __init__(self) -> None:
         """Initialize a new DB instance
+            The pool keeps DB_POOL_SIZE connections (5 by default)
+            The database is emptied unless DB_RESET=0, in which case
+            an existing a.db is kept and migrated
         """
-        self._engine = create_engine("sqlite:///a.db")
-        Base.metadata.drop_all(self._engine)
+        self._engine = create_engine(
+            "sqlite:///a.db", poolclass=QueuePool, pool_pre_ping=True,
+            pool_size=int(getenv("DB_POOL_SIZE", 5)),
+            connect_args={"check_same_thread": False})
+        event.listen(self._engine, "connect", _set_sqlite_pragmas)
+        if getenv("DB_RESET", "1") != "0":
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        _migrate(self._engine)
+        self.__session = scoped_session(sessionmaker(bind=self._engine,
+                                                     expire_on_commit=False))
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """Closes the session of the current thread, giving its
+            connection back to the pool
+        """
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """ Creates new User instance and saves them to the database
@@ -41,7 +58,7 @@ class DB:
         session = self._session
         new_user = User(email=email, hashed_password=hashed_password)
         session.add(new_user)
-        session.commit()
+        self._commit(session)
         return new_user
 
     def find_user_by(self, **kwargs) -> User:
@@ -74,5 +91,50 @@ class DB:
             if not hasattr(user, key):
                 raise ValueError
             setattr(user, key, value)
-        session.commit()
+        self._commit(session)
         return None
+
+    def _commit(self, session: Session) -> None:
+        """Commits a session, rolled back if the commit fails so the
+            thread can use it again
+        """
+        try:
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+
+def _migrate(engine) -> None:
+    """Adds the indexes of the users table missing from a database
+        created by an older version, keeping its rows
+        Duplicated session ids are cleared first, logging out the
+        users sharing them; duplicated emails cannot be resolved
+        and make the migration fail without changing anything
+    """
+    existing = {index["name"] for index in inspect(engine)
+                .get_indexes(User.__tablename__)}
+    missing = [index for index in User.__table__.indexes
+               if index.name not in existing]
+    if not missing:
+        return
+    with engine.begin() as connection:
+        for index in missing:
+            if index.unique and "session_id" in index.columns:
+                connection.execute(text(
+                    "UPDATE users SET session_id = NULL WHERE session_id IN "
+                    "(SELECT session_id FROM users GROUP BY session_id "
+                    "HAVING COUNT(*) > 1)"))
+            index.create(connection)
+
+
+def _set_sqlite_pragmas(connection, connection_record) -> None:
+    """Pragmas of each new SQLite connection: readers do not wait for
+        the writer in WAL mode, and a writer waits for another one
+        instead of failing
+    """
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
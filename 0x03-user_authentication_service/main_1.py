@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Concurrent load: threads logging in then reading their profile
+Run as: AUTH_BCRYPT_ROUNDS=4 ./main_1.py
+"""
+from app import app
+import threading
+import time
+
+PROFILE_READS = 9
+
+
+def worker(number: int, seconds: float, results: list) -> None:
+    """ Logs in then reads the profile, for some seconds
+    """
+    client = app.test_client()
+    email = "worker{}@hbtn.io".format(number)
+    requests = errors = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        response = client.post("/sessions",
+                               data={"email": email, "password": "pwd"})
+        requests += 1
+        if response.status_code != 200:
+            errors += 1
+            continue
+        for _ in range(PROFILE_READS):
+            response = client.get("/profile")
+            requests += 1
+            if response.status_code != 200 or \
+                    response.get_json() != {"email": email}:
+                errors += 1
+    results.append((requests, errors))
+
+
+if __name__ == "__main__":
+    client = app.test_client()
+    for number in range(32):
+        client.post("/users", data={"email": "worker{}@hbtn.io"
+                                    .format(number), "password": "pwd"})
+    for count in (1, 2, 4, 8, 16, 32):
+        results = []
+        threads = [threading.Thread(target=worker, args=(i, 2, results))
+                   for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print("{} threads: {} requests/s, {} errors".format(
+            count, sum(r[0] for r in results) // 2,
+            sum(r[1] for r in results)))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Lookup latency before and after migrating a users table to indexes
+Run as: ./main_2.py [number of users], in a directory without a.db
+"""
+from sqlalchemy.orm.exc import NoResultFound
+import os
+import sqlite3
+import sys
+import time
+
+LOOKUPS = 100
+
+
+def timed(lookup, values) -> float:
+    """ Average milliseconds of a lookup
+    """
+    start = time.perf_counter()
+    for value in values:
+        lookup(value)
+    return (time.perf_counter() - start) * 1000 / len(values)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    connection = sqlite3.connect("a.db")
+    connection.execute("CREATE TABLE users (id INTEGER NOT NULL, "
+                       "email VARCHAR(250) NOT NULL, "
+                       "hashed_password VARCHAR(250) NOT NULL, "
+                       "session_id VARCHAR(250), reset_token VARCHAR(250), "
+                       "PRIMARY KEY (id))")
+    connection.executemany(
+        "INSERT INTO users (email, hashed_password, session_id) "
+        "VALUES (?, ?, ?)",
+        (("user{}@hbtn.io".format(i), "hash", "session-{}".format(i))
+         for i in range(count)))
+    connection.commit()
+    step = count // LOOKUPS
+    emails = ["user{}@hbtn.io".format(i) for i in range(0, count, step)]
+    sessions = ["session-{}".format(i) for i in range(0, count, step)]
+    queries = (("email", "SELECT id FROM users WHERE email = ?", emails),
+               ("session_id", "SELECT id FROM users WHERE session_id = ?",
+                sessions))
+
+    def raw(query):
+        """ Lookup through sqlite3 """
+        return lambda value: connection.execute(query, (value,)).fetchone()
+
+    before = {name: timed(raw(query), values[:10])
+              for name, query, values in queries}
+    connection.close()
+
+    os.environ["DB_RESET"] = "0"
+    from db import DB
+    start = time.perf_counter()
+    db = DB()
+    migration = time.perf_counter() - start
+    connection = sqlite3.connect("a.db")
+    after = {name: timed(raw(query), values)
+             for name, query, values in queries}
+
+    def find(key):
+        """ Lookup through DB.find_user_by """
+        def lookup(value):
+            try:
+                db.find_user_by(**{key: value})
+            except NoResultFound:
+                pass
+        return lookup
+
+    print("{} users, migrated in {:.1f} s".format(count, migration))
+    for name, query, values in queries:
+        print("{}: {:.3f} ms before, {:.3f} ms after, "
+              "{:.3f} ms with find_user_by".format(
+                  name, before[name], after[name],
+                  timed(find(name), values)))
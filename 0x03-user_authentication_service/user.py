@@ -10,11 +10,13 @@ Base = declarative_base()
 class User(Base):
     """
     User class
+    email and session_id are looked up on every login and request,
+    so they have unique indexes, reset_token a plain one
     """
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250))
-    reset_token = Column(String(250))
+    session_id = Column(String(250), unique=True, index=True)
+    reset_token = Column(String(250), index=True)